@@ -1,18 +1,9 @@
 # app.py
 from flask import Flask, render_template, Response, redirect, url_for, session, request, jsonify
 from functools import wraps
-from werkzeug.security import check_password_hash
-import os
-
-# Подключаем маршруты из модулей логики
-from logic.products import register_products_routes
-from logic.china_orders import register_china_orders_routes
-
-app = Flask(__name__)
-
-# ====== Сессии и админ-креды ======
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "change-me-please-very-secret")
+import os, time
 
+# ====== Админ-креды ======
 ADMIN_USER = "Muhammad"
 # Хэш для пароля "Fotimajon2021" (pbkdf2:sha256)
 ADMIN_PASS_HASH = "pbkdf2:sha256:1000000$WwOv7o68tBt6SSAF$e04e8141a904cc656031c234a8e13e33b327ebd87d281659bc6c78d9c4f706ee"
@@ -32,103 +23,166 @@ def login_required(view_func):
         return view_func(*args, **kwargs)
     return wrapped
 
-# =========================
-#        Аутентификация
-# =========================
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    # уже залогинен
-    if session.get("user") == ADMIN_USER:
+def create_app():
+    """
+    Фабрика приложения. Модули логики импортируются здесь, а не при импорте app.py,
+    каталог данных создаётся здесь же. Сами записи читаются с диска первым запросом —
+    или заранее через warm_up() (gunicorn.conf.py).
+    """
+    t0 = time.perf_counter()
+    from logic.storage import ensure_data_dir
+    from logic.serializer import FastJSONProvider, init_compression
+    from logic.metrics import init_metrics, record_startup
+    from logic.products import register_products_routes
+    from logic.china_orders import register_china_orders_routes
+    from logic.jobs import register_jobs_routes
+    from logic.stats import register_stats_routes
+    from logic.events import register_events_routes
+    from logic.auth import (init_proxy, verify_password, login_throttle, client_ip,
+                            too_many_attempts, BUSY_RETRY_SECONDS)
+
+    ensure_data_dir()
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)   # orjson, если установлен; компактный вывод
+    init_metrics(app)                  # латентность/размеры по маршрутам, GET /metrics; строго до init_compression
+    init_compression(app)              # gzip/br для больших JSON/CSV-ответов по Accept-Encoding
+    init_proxy(app)                    # remote_addr из X-Forwarded-For за доверенным прокси (AUTH_TRUST_PROXY)
+
+    # ====== Сессии ======
+    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "change-me-please-very-secret")
+
+    # =========================
+    #        Аутентификация
+    # =========================
+    @app.route("/login", methods=["GET", "POST"])
+    def login():
+        # уже залогинен
+        if session.get("user") == ADMIN_USER:
+            return redirect(url_for("products_page"))
+
+        if request.method == "POST":
+            # хэш пароля — секунда CPU: считается в пуле процессов, попытки ограничены по IP (logic/auth.py)
+            ip = client_ip()
+            retry_after = login_throttle.hit(ip)
+            if retry_after:
+                return too_many_attempts(retry_after)
+            username = (request.form.get("username") or "").strip()
+            password = request.form.get("password") or ""
+            ok = username == ADMIN_USER and verify_password(ADMIN_PASS_HASH, password)
+            if ok is None:
+                return too_many_attempts(BUSY_RETRY_SECONDS)
+            if ok:
+                login_throttle.reset(ip)
+                session["user"] = ADMIN_USER
+                next_url = request.args.get("next") or url_for("products_page")
+                return redirect(next_url)
+            # неверные креды
+            return render_template("login.html"), 401
+
+        # GET
+        return render_template("login.html")
+
+    @app.route("/logout")
+    def logout():
+        session.clear()
+        return redirect(url_for("login"))
+
+    # Диагностика: быстро понять, вошли ли
+    @app.get("/whoami")
+    def whoami():
+        return jsonify({
+            "user": session.get("user"),
+            "is_admin": session.get("user") == ADMIN_USER
+        })
+
+    # =========================
+    #         Страницы
+    # =========================
+    @app.route("/")
+    def root_redirect():
         return redirect(url_for("products_page"))
 
-    if request.method == "POST":
-        username = (request.form.get("username") or "").strip()
-        password = request.form.get("password") or ""
-        if username == ADMIN_USER and check_password_hash(ADMIN_PASS_HASH, password):
-            session["user"] = ADMIN_USER
-            next_url = request.args.get("next") or url_for("products_page")
-            return redirect(next_url)
-        # неверные креды
-        return render_template("login.html"), 401
-
-    # GET
-    return render_template("login.html")
-
-@app.route("/logout")
-def logout():
-    session.clear()
-    return redirect(url_for("login"))
-
-# Диагностика: быстро понять, вошли ли
-@app.get("/whoami")
-def whoami():
-    return jsonify({
-        "user": session.get("user"),
-        "is_admin": session.get("user") == ADMIN_USER
-    })
-
-# =========================
-#         Страницы
-# =========================
-@app.route("/")
-def root_redirect():
-    return redirect(url_for("products_page"))
-
-@app.route("/admin/products")
-@login_required
-def products_page():
-    return render_template("products.html")
-
-@app.route("/admin/orders")
-@login_required
-def orders_page():
-    return render_template("orders.html")
-
-@app.route("/admin/clients")
-@login_required
-def clients_page():
-    return render_template("clients.html")
-
-@app.route("/admin/warehouse")
-@login_required
-def warehouse_page():
-    return render_template("warehouse.html")
-
-@app.route("/admin/china-orders")
-@login_required
-def china_orders_page():
-    return render_template("china_orders.html")
-
-@app.route("/admin/stats")
-@login_required
-def stats_page():
-    return render_template("stats.html")
-
-@app.route("/admin/settings")
-@login_required
-def settings_page():
-    return render_template("settings.html")
-
-@app.route("/admin/import")
-@login_required
-def import_page():
-    return render_template("import.html")
-
-@app.route("/admin/scanner")
-@login_required
-def scanner_page():
-    return render_template("scanner.html")
-
-# --- Health ---
-@app.get("/health")
-def health():
-    return Response("OK", content_type="text/plain; charset=utf-8")
-
-# =========================
-#   Регистрация модулей API
-# =========================
-register_products_routes(app)        # /api/products, /api/products/import, /api/products/export, /api/brands, /api/products-by-brand
-register_china_orders_routes(app)    # /api/china-orders*, экспорт, статусы
+    @app.route("/admin/products")
+    @login_required
+    def products_page():
+        return render_template("products.html")
+
+    @app.route("/admin/orders")
+    @login_required
+    def orders_page():
+        return render_template("orders.html")
+
+    @app.route("/admin/clients")
+    @login_required
+    def clients_page():
+        return render_template("clients.html")
+
+    @app.route("/admin/warehouse")
+    @login_required
+    def warehouse_page():
+        return render_template("warehouse.html")
+
+    @app.route("/admin/china-orders")
+    @login_required
+    def china_orders_page():
+        return render_template("china_orders.html")
+
+    @app.route("/admin/stats")
+    @login_required
+    def stats_page():
+        return render_template("stats.html")
+
+    @app.route("/admin/settings")
+    @login_required
+    def settings_page():
+        return render_template("settings.html")
+
+    @app.route("/admin/import")
+    @login_required
+    def import_page():
+        return render_template("import.html")
+
+    @app.route("/admin/scanner")
+    @login_required
+    def scanner_page():
+        return render_template("scanner.html")
+
+    # --- Health ---
+    @app.get("/health")
+    def health():
+        return Response("OK", content_type="text/plain; charset=utf-8")
+
+    # =========================
+    #   Регистрация модулей API
+    # =========================
+    register_products_routes(app)        # /api/products, /api/products/import, /api/products/export, /api/brands, /api/products-by-brand
+    register_china_orders_routes(app)    # /api/china-orders*, экспорт, статусы
+    register_jobs_routes(app)            # /api/jobs/<id> — статус фоновых импортов/экспортов
+    register_stats_routes(app)           # /api/stats/* — склад, низкий остаток, закупки
+    register_events_routes(app)          # /api/events — лента изменений (SSE)
+
+    record_startup("create_app", time.perf_counter() - t0)
+    return app
+
+
+def warm_up():
+    """
+    Прочитать хранилища и построить индексы заранее. В gunicorn с preload_app это
+    делается один раз в мастере до fork: воркеры получают готовый каталог через
+    copy-on-write и не читают products.json каждый сам.
+    """
+    from logic.products import products_store, brands_store, backfill_created_seq
+    from logic.china_orders import china_store
+    from logic.metrics import record_startup
+
+    t0 = time.perf_counter()
+    for store in (products_store, brands_store, china_store):
+        store.refresh()
+    backfill_created_seq()   # номера создания для записей старого формата (один раз)
+    record_startup("warm_up", time.perf_counter() - t0)
+
+
+app = create_app()   # gunicorn app:app (Procfile)
 
 if __name__ == "__main__":
     # На хостингах (Railway/Render/Heroku) PORT приходит из окружения
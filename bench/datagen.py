@@ -0,0 +1,77 @@
+# bench/datagen.py
+"""
+Синтетические данные для бенчмарков: каталог товаров и история заказов из Китая.
+Генерация детерминирована (seed), так что прогоны на разных коммитах сравнимы.
+"""
+import random, uuid
+from datetime import date, timedelta
+
+BRANDS = ["apple", "samsung", "xiaomi", "huawei", "honor", "oppo", "vivo", "realme",
+          "tecno", "infinix", "nokia", "motorola", "google", "oneplus", "poco", "zte"]
+QUALITIES = ["orig", "KBS", "copy", "AAA", "service pack", "OLED", "incell"]
+TYPES = ["дисплей", "аккумулятор", "шлейф", "корпус", "камера", "динамик", "стекло"]
+TAGS = ["хит", "новинка", "акция", "под заказ", "в наличии", "оптом"]
+VENDORS = ["Shenzhen Parts", "Guangzhou Mobile", "Huaqiang", "Yiwu Trade", "Foshan LCD",
+           "Dongguan Cell", "Hong Kong Direct", "Xiamen Glass"]
+CURRENCIES = ["TJS", "USD", "CNY"]
+STATUSES = ["New", "Paid", "Shipped", "Received", "Cancelled"]
+
+
+def _uuid(rnd: random.Random) -> str:
+    return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+
+def product_row(rnd: random.Random, i: int) -> dict:
+    """Строка импорта (без id) — как её прислал бы клиент."""
+    brand = rnd.choice(BRANDS)
+    return {
+        "brand": brand,
+        "model": f"{brand.title()} {rnd.choice(['A', 'S', 'Note', 'Pro', 'Max', 'Y', 'X'])}{i}",
+        "quality": rnd.choice(QUALITIES),
+        "price": round(rnd.uniform(20, 2500), 2),
+        "currency": rnd.choice(CURRENCIES[:2]),
+        "vendor": rnd.choice(VENDORS),
+        "stock": rnd.randint(0, 200),
+        "type": rnd.choice(TYPES),
+        "tags": rnd.sample(TAGS, rnd.randint(0, 3)),
+        "specs": f"{rnd.choice(['6.1', '6.5', '6.7', '5.8'])}\"; {rnd.randint(1, 4)} шт/уп",
+        "photo": "",
+        "active": rnd.random() > 0.05,
+    }
+
+
+def make_catalog(n: int, seed: int = 1) -> list:
+    """Записи в том виде, в каком они лежат в products.json (с id и sku)."""
+    from logic.products import normalized_item
+    rnd = random.Random(seed)
+    items = []
+    for i in range(n):
+        rec = normalized_item(product_row(rnd, i))
+        rec["id"] = _uuid(rnd)
+        items.append(rec)
+    return items
+
+
+def make_orders(n: int, catalog: list, seed: int = 2) -> list:
+    rnd = random.Random(seed)
+    start = date(2024, 1, 1)
+    orders = []
+    for _ in range(n):
+        lines = []
+        for p in rnd.sample(catalog, min(len(catalog), rnd.randint(1, 5))):
+            price, qty = round(p["price"] * 0.6, 2), rnd.randint(1, 50)
+            lines.append({"brand": p["brand"], "model": p["model"], "quality": p["quality"],
+                          "price": price, "qty": qty, "sum": round(price * qty, 2)})
+        shipping = round(rnd.uniform(0, 300), 2)
+        orders.append({
+            "id": _uuid(rnd),
+            "date": str(start + timedelta(days=rnd.randint(0, 730))),
+            "vendor": rnd.choice(VENDORS),
+            "currency": rnd.choice(CURRENCIES),
+            "note": "",
+            "status": rnd.choice(STATUSES),
+            "shipping_cost": shipping,
+            "items": lines,
+            "total": round(sum(x["sum"] for x in lines) + shipping, 2),
+        })
+    return orders
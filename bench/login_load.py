@@ -0,0 +1,153 @@
+# bench/login_load.py
+"""
+Нагрузочный тест: бот перебирает пароли, пока обычные клиенты ходят в API.
+
+    python -m bench.login_load                               # inline/pool × sync/gthread
+    python -m bench.login_load --modes pool --worker-classes gevent --bots 16 --ips 16
+    python -m bench.login_load --url http://127.0.0.1:8080   # уже запущенный сервер
+
+Для каждого сочетания режима проверки пароля (inline — AUTH_HASH_WORKERS=0, pool — пул
+процессов) и типа воркера поднимается gunicorn со своим временным DATA_DIR. Затем
+--duration секунд --bots потоков шлют неверные пароли на POST /login, а --clients потоков
+запрашивают GET /health и GET /login. Печатаются латентность клиентов (p50/p95/p99)
+и исходы попыток входа (401 — пароль проверен, 429 — отсечено до проверки).
+
+Бот входит под логином администратора (--username): для чужого логина пароль не проверяется.
+--ips N — бот ходит с N адресов: сервер запускается с AUTH_TRUST_PROXY=1, и бенч играет
+роль этого прокси — шлёт один адрес в X-Forwarded-For, как его дописал бы nginx;
+--max-attempts — AUTH_MAX_ATTEMPTS сервера (по умолчанию очень большой, чтобы мерить сам пул).
+"""
+import argparse, itertools, json, os, socket, subprocess, sys, tempfile, threading, time
+import urllib.error, urllib.parse, urllib.request
+
+from bench.run import ROOT, percentile
+
+CLIENT_PATHS = ("/health", "/login")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url: str, data: bytes = None, headers: dict = None):
+    """(статус, секунды); ответ дочитывается целиком."""
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as r:
+            r.read()
+            status = r.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - t0
+
+
+def start_server(mode: str, worker_class: str, workers: int, max_attempts: int, tmp: str):
+    port = free_port()
+    env = {**os.environ, "DATA_DIR": tmp, "PRELOAD_CATALOG": "0",
+           "AUTH_HASH_WORKERS": "0" if mode == "inline" else os.getenv("AUTH_HASH_WORKERS", "1"),
+           "AUTH_MAX_ATTEMPTS": str(max_attempts), "AUTH_TRUST_PROXY": "1",
+           "GUNICORN_WORKER_CLASS": worker_class, "WEB_CONCURRENCY": str(workers)}
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{port}",
+                             "--log-level", "warning"], cwd=ROOT, env=env)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if request(url + "/health")[0] == 200:
+            return proc, url
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn завершился с кодом {proc.returncode}")
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn не поднялся за 30 с")
+
+
+def run_load(url: str, duration: float, bots: int, clients: int, ips: int, username: str) -> dict:
+    stop = time.monotonic() + duration
+    client_lat, login_lat, outcomes = [], [], {}
+    lock = threading.Lock()
+    body = urllib.parse.urlencode({"username": username, "password": "wrong"}).encode()
+    addrs = itertools.cycle([f"10.0.{i // 256}.{i % 256}" for i in range(ips)] or [None])
+
+    def bot():
+        while time.monotonic() < stop:
+            with lock:
+                addr = next(addrs)
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+            if addr:
+                headers["X-Forwarded-For"] = addr
+            status, sec = request(url + "/login", body, headers)
+            with lock:
+                outcomes[status] = outcomes.get(status, 0) + 1
+                login_lat.append(sec)
+
+    def client(i):
+        paths = itertools.cycle(CLIENT_PATHS[i % 2:] + CLIENT_PATHS[:i % 2])
+        while time.monotonic() < stop:
+            _, sec = request(url + next(paths))
+            with lock:
+                client_lat.append(sec)
+
+    threads = [threading.Thread(target=bot) for _ in range(bots)]
+    threads += [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    client_lat.sort()
+    login_lat.sort()
+    ms = lambda v: round(v * 1000, 1)
+    return {
+        "client_requests": len(client_lat),
+        "client_rps": round(len(client_lat) / duration, 1),
+        "client_p50_ms": ms(percentile(client_lat, 50)),
+        "client_p95_ms": ms(percentile(client_lat, 95)),
+        "client_p99_ms": ms(percentile(client_lat, 99)),
+        "login_attempts": len(login_lat),
+        "login_p50_ms": ms(percentile(login_lat, 50)),
+        "login_status": {str(k): v for k, v in sorted(outcomes.items())},
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Нагрузочный тест входа")
+    ap.add_argument("--url", default=None, help="не запускать gunicorn, бить в этот адрес")
+    ap.add_argument("--modes", nargs="+", choices=["inline", "pool"], default=["inline", "pool"])
+    ap.add_argument("--worker-classes", nargs="+", default=["sync", "gthread"])
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--duration", type=float, default=10)
+    ap.add_argument("--bots", type=int, default=4)
+    ap.add_argument("--clients", type=int, default=4)
+    ap.add_argument("--ips", type=int, default=0)
+    ap.add_argument("--max-attempts", type=int, default=10 ** 9)
+    ap.add_argument("--username", default="Muhammad", help="ADMIN_USER из app.py")
+    args = ap.parse_args(argv)
+
+    if args.url:
+        print(json.dumps(run_load(args.url, args.duration, args.bots, args.clients, args.ips, args.username), ensure_ascii=False))
+        return
+
+    report = {}
+    for mode, worker_class in itertools.product(args.modes, args.worker_classes):
+        with tempfile.TemporaryDirectory(prefix="bench-login-") as tmp:
+            proc, url = start_server(mode, worker_class, args.workers, args.max_attempts, tmp)
+            try:
+                r = run_load(url, args.duration, args.bots, args.clients, args.ips, args.username)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+        report[f"{mode}/{worker_class}"] = r
+        print(f"  {mode:<6} {worker_class:<8} клиенты p50 {r['client_p50_ms']:>8.1f} ms  "
+              f"p99 {r['client_p99_ms']:>8.1f} ms  {r['client_rps']:>7.1f} rps   "
+              f"вход {r['login_attempts']} попыток {r['login_status']}", file=sys.stderr)
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
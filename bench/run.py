@@ -0,0 +1,232 @@
+# bench/run.py
+"""
+Бенчмарк API каталога и заказов на синтетических данных.
+
+    python -m bench.run                         # 1k и 10k товаров
+    python -m bench.run --sizes 1000 10000 100000 --backend sqlite
+    python -m bench.run --compare bench/results/<прошлый прогон>.json
+
+Каждый размер гоняется в отдельном процессе со своим временным DATA_DIR
+(модули читают окружение при импорте, а кэши/индексы не должны переживать прогон).
+Запросы идут через Flask test client с залогиненной сессией. По каждому сценарию:
+пропускная способность, p50/p95/p99/среднее (мс) и пиковая память (tracemalloc).
+Итог — JSON в bench/results/, для сравнения прогонов между коммитами.
+"""
+import argparse, json, math, os, platform, random, subprocess, sys, tempfile, time, tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Перцентиль по ближайшему рангу."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def measure(fn, repeat: int, mem_repeat: int = 3) -> dict:
+    """Латентность без tracemalloc (он сам замедляет код), затем пик памяти на нескольких вызовах."""
+    fn()  # прогрев: первый вызов строит индексы/кэши
+    lat = []
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - t_start
+
+    tracemalloc.start()
+    for _ in range(mem_repeat):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    lat.sort()
+    return {
+        "n": repeat,
+        "rps": round(repeat / wall, 2) if wall else None,
+        "mean_ms": round(sum(lat) / len(lat) * 1000, 3),
+        "p50_ms": round(percentile(lat, 50) * 1000, 3),
+        "p95_ms": round(percentile(lat, 95) * 1000, 3),
+        "p99_ms": round(percentile(lat, 99) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+# ---------- Один размер каталога (в дочернем процессе) ----------
+def run_size(size: int, repeat: int, heavy_repeat: int) -> dict:
+    from bench.datagen import make_catalog, make_orders, product_row
+    from logic.storage import make_storage
+    from logic import products
+    from logic.china_orders import CHINA_FILE, CHINA_COLUMNS
+
+    catalog = make_catalog(size)
+    orders = make_orders(max(size // 10, 100), catalog)
+    # с теми же колонками, что у модулей: для sqlite таблица создаётся первым make_storage
+    make_storage(products.PRODUCTS_FILE, products.PRODUCT_COLUMNS).save(catalog)
+    make_storage(CHINA_FILE, CHINA_COLUMNS).save(orders)
+
+    import app as app_module
+    from logic.http_cache import response_cache
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as s:
+        s["user"] = app_module.ADMIN_USER
+
+    rnd = random.Random(42)
+    ids = [p["id"] for p in catalog]
+    words = [p["model"].split()[-1].lower() for p in rnd.sample(catalog, min(200, size))]
+
+    def get(url, **kw):
+        r = client.get(url, **kw)
+        assert r.status_code in (200, 304), (url, r.status_code)
+        for _ in r.iter_encoded():   # потоковые ответы дочитываем, не собирая тело в памяти
+            pass
+        r.close()
+        return r
+
+    def uncached(url):
+        def call():
+            response_cache.clear()
+            get(url)
+        return call
+
+    counter = iter(range(10 ** 9))
+
+    def upsert():
+        row = product_row(rnd, size + next(counter))
+        if rnd.random() < 0.5:
+            row = {**rnd.choice(catalog), "stock": 1}
+            row.pop("id")
+        r = client.post("/api/products", json=row)
+        assert r.status_code in (200, 201), r.status_code
+
+    def stock_batch():
+        rows = [{"id": i, "delta": rnd.randint(1, 3)} for i in rnd.sample(ids, 50)]
+        r = client.put("/api/stock-batch", json=rows)
+        assert r.status_code == 200, r.status_code
+
+    def import_1k():
+        rows = [product_row(rnd, size + next(counter)) for _ in range(1000)]
+        body = "\n".join(json.dumps(x, ensure_ascii=False) for x in rows)
+        r = client.post("/api/products/import?format=ndjson", data=body.encode("utf-8"),
+                        content_type="application/x-ndjson")
+        assert r.status_code == 200, r.status_code
+
+    sample_items = rnd.sample(catalog, min(1000, size))
+
+    scenarios = {
+        # функции без HTTP
+        "fn.normalized_item": (lambda: [products.normalized_item(p) for p in sample_items], repeat),
+        "fn.find_by_sku": (lambda: products.find_by_sku(catalog, catalog[-1]["sku"]), heavy_repeat),
+        "fn.store_find_by_sku": (lambda: products.store_find_by_sku(rnd.choice(catalog)["sku"]), repeat),
+        "fn.merge_product": (lambda: [products.merge_product(dict(p), p) for p in sample_items], repeat),
+        # чтение
+        "list.page": (lambda: get(f"/api/products?limit=50&offset={rnd.randrange(size)}&sort=price_desc"), repeat),
+        "list.page_filtered": (lambda: get("/api/products?limit=50&brand=apple&stock_min=10"), repeat),
+        "list.full_cached": (lambda: get("/api/products"), repeat),
+        "list.full_uncached": (uncached("/api/products"), heavy_repeat),
+        "brands": (uncached("/api/brands"), repeat),
+        "by_brand": (uncached("/api/products-by-brand?brand=samsung"), repeat),
+        "search": (lambda: uncached(f"/api/products-by-brand?q={rnd.choice(words)}")(), repeat),
+        "china.list_filtered": (lambda: get("/api/china-orders?status=Paid&date_from=2025-01-01"), repeat),
+        "china.totals": (lambda: get("/api/china-orders/totals"), repeat),
+        # выгрузки
+        "export.json": (lambda: get("/api/products/export"), heavy_repeat),
+        "export.csv": (lambda: get("/api/products/export?format=csv"), heavy_repeat),
+        "export.xlsx": (lambda: get("/api/products/export?format=xlsx"), heavy_repeat),
+        "china.export_csv": (lambda: get("/api/china-orders/export.csv"), heavy_repeat),
+        # запись
+        "upsert": (upsert, repeat),
+        "stock_batch.50": (stock_batch, repeat),
+        "import.ndjson_1k": (import_1k, heavy_repeat),
+    }
+
+    results = {}
+    for name, (fn, n) in scenarios.items():
+        results[name] = measure(fn, n)
+        print(f"  {size:>7} {name:<22} p50 {results[name]['p50_ms']:>9.3f} ms  "
+              f"p99 {results[name]['p99_ms']:>9.3f} ms  peak {results[name]['peak_kb']:>9.1f} KB",
+              file=sys.stderr)
+    return results
+
+
+def _worker(args):
+    results = run_size(args.size, args.repeat, args.heavy_repeat)
+    print(json.dumps(results))
+
+
+# ---------- Оркестрация ----------
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(current: dict, baseline: dict):
+    """Изменение p50 по сценариям относительно прошлого прогона."""
+    for size, scen in current["sizes"].items():
+        base = baseline.get("sizes", {}).get(size) or {}
+        print(f"\n== {size} (база: {baseline.get('meta', {}).get('commit') or '?'})")
+        for name, r in scen.items():
+            b = base.get(name)
+            if not b or not b.get("p50_ms"):
+                print(f"  {name:<22} {r['p50_ms']:>9.3f} ms   (нет в базе)")
+                continue
+            delta = (r["p50_ms"] - b["p50_ms"]) / b["p50_ms"] * 100
+            print(f"  {name:<22} {b['p50_ms']:>9.3f} -> {r['p50_ms']:>9.3f} ms  {delta:+6.1f}%")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Бенчмарк API каталога")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--repeat", type=int, default=200, help="вызовов на лёгкий сценарий")
+    ap.add_argument("--heavy-repeat", type=int, default=10, help="вызовов на тяжёлый сценарий (полные выгрузки)")
+    ap.add_argument("--backend", choices=["json", "journal", "sqlite"], default="json")
+    ap.add_argument("--out", type=Path, default=None)
+    ap.add_argument("--compare", type=Path, default=None, help="JSON прошлого прогона")
+    ap.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.worker:
+        return _worker(args)
+
+    from logic import serializer
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "json": serializer.BACKEND,
+            "backend": args.backend,
+            "repeat": args.repeat,
+            "heavy_repeat": args.heavy_repeat,
+        },
+        "sizes": {},
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+            env = {**os.environ, "DATA_DIR": tmp, "STORAGE_BACKEND": args.backend,
+                   "SQLITE_PATH": str(Path(tmp) / "bench.sqlite3")}
+            cmd = [sys.executable, "-m", "bench.run", "--worker", "--size", str(size),
+                   "--repeat", str(args.repeat), "--heavy-repeat", str(args.heavy_repeat)]
+            out = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, check=True, text=True)
+            report["sizes"][str(size)] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    out_path = args.out or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'local'}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"результаты: {out_path}")
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# gunicorn.conf.py — gunicorn подхватывает его сам (Procfile: gunicorn app:app)
+"""
+Быстрый старт воркеров:
+
+- preload_app: app.py импортируется один раз в мастере, воркеры получают его через fork;
+- в мастере же читается каталог и строятся индексы (app.warm_up), так что воркер
+  готов к запросам сразу и не парсит products.json сам; страницы памяти общие (copy-on-write);
+- соединения SQLite мастер закрывает перед каждым fork (pre_fork): через fork их переносить нельзя;
+- gc.freeze() перед fork: объекты каталога уходят в «постоянное» поколение, сборщик
+  мусора в воркерах их не обходит и не пачкает страницы.
+
+PRELOAD_CATALOG=0 — не прогревать (например, при очень большом каталоге и одном воркере).
+Время create_app/прогрева — в /metrics: app_startup_seconds{phase=...}.
+
+Тип воркера — GUNICORN_WORKER_CLASS:
+
+- gthread (по умолчанию): GUNICORN_THREADS потоков на процесс. Долгие запросы —
+  поток SSE /api/events, ожидание проверки пароля (logic/auth.py) — занимают поток, а не процесс.
+  Потоков SSE на процесс — не больше половины GUNICORN_THREADS (EVENTS_MAX_STREAMS,
+  logic/events.py), остальные вкладки получают изменения опросом;
+- gevent (pip install gevent): тысячи соединений на процесс, все ожидания кооперативные;
+  monkey-patching делается здесь, до preload_app, иначе app.py импортирует
+  непропатченные threading/socket;
+- sync: по запросу на процесс — как было; SSE и вход при нём держат воркер целиком.
+
+Пример: WEB_CONCURRENCY=2 GUNICORN_THREADS=16 gunicorn app:app
+Нагрузочный тест входа под ботом: python -m bench.login_load (см. bench/login_load.py).
+"""
+import gc, os
+
+if os.getenv("GUNICORN_WORKER_CLASS") == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+preload_app = True
+# workers/bind — по умолчанию gunicorn (WEB_CONCURRENCY, PORT из окружения)
+
+# потоки вместо sync: поток ленты изменений (SSE /api/events) держит соединение минутами,
+# в sync-воркере он занял бы весь процесс. Хранилища потокобезопасны (RecordStore под RLock).
+worker_class = os.getenv("GUNICORN_WORKER_CLASS") or "gthread"
+# только для gthread: при threads > 1 gunicorn молча заменяет sync на gthread
+threads = int(os.getenv("GUNICORN_THREADS") or 8) if worker_class == "gthread" else 1
+
+
+def when_ready(server):
+    if (os.getenv("PRELOAD_CATALOG") or "1") != "0":
+        from app import warm_up
+        warm_up()
+        server.log.info("catalog warmed up")
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    # соединения SQLite, открытые прогревом в мастере, воркерам не передаём
+    from logic.storage import close_connections
+    close_connections()
@@ -0,0 +1,137 @@
+# logic/auth.py
+"""
+Проверка пароля при входе — вне потока запроса.
+
+check_password_hash на pbkdf2:sha256 с 1 000 000 итераций — около секунды чистого CPU.
+Прямо в обработчике /login пачка входов (или бот, перебирающий пароли) занимает
+воркер, и все остальные запросы ждут за ней. Поэтому:
+
+- хэш считается в пуле процессов (AUTH_HASH_WORKERS на воркер gunicorn): CPU на входы
+  ограничен размером пула, а запрос только ждёт результат — в gthread/gevent-воркере
+  (gunicorn.conf.py) остальные запросы тем временем обслуживаются;
+- проверок в работе и в очереди не больше AUTH_HASH_QUEUE, лишние — сразу 429;
+- попытки считаются по IP: больше AUTH_MAX_ATTEMPTS за AUTH_WINDOW_SECONDS — 429
+  с Retry-After, и хэш для такого запроса не считается вовсе. Удачный вход сбрасывает счётчик.
+  Счётчик — в памяти воркера (у каждого свой), так что предел грубый: до N × воркеров;
+- AUTH_HASH_WORKERS=0 — прежний режим: проверка прямо в потоке запроса.
+
+IP клиента — request.remote_addr. За прокси (Railway/Render/nginx) AUTH_TRUST_PROXY=N —
+число прокси перед приложением: init_proxy() ставит werkzeug ProxyFix(x_for=N), и адресом
+клиента становится N-й справа адрес X-Forwarded-For — тот, что дописал наш прокси.
+Левые адреса присылает сам клиент, верить им нельзя: подставляя в заголовок новый адрес
+на каждую попытку, бот обходил бы ограничение по IP. Без прокси — AUTH_TRUST_PROXY=0.
+Пул создаётся при первом входе в самом воркере (spawn, а не fork: воркер gthread
+многопоточный); с preload_app мастер его не создаёт, после fork пул родителя не используется.
+spawn импортирует главный модуль заново: в своих скриптах, которые входят через app,
+код — под if __name__ == "__main__" (или AUTH_HASH_WORKERS=0).
+"""
+from flask import request, render_template
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import check_password_hash
+import math, multiprocessing, os, threading, time
+
+from logic.metrics import timer, CALL_SECONDS
+
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS") or 1)
+AUTH_HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE") or 4)
+AUTH_MAX_ATTEMPTS = int(os.getenv("AUTH_MAX_ATTEMPTS") or 10)
+AUTH_WINDOW_SECONDS = int(os.getenv("AUTH_WINDOW_SECONDS") or 300)
+AUTH_TRUST_PROXY = int(os.getenv("AUTH_TRUST_PROXY") or 0)   # число доверенных прокси перед приложением
+BUSY_RETRY_SECONDS = 2
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, AUTH_HASH_QUEUE))
+
+
+def _pool():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=AUTH_HASH_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _reset_pool(broken):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+
+
+def verify_password(pwhash: str, password: str):
+    """True/False; None — очередь проверок заполнена, пусть клиент повторит позже."""
+    if AUTH_HASH_WORKERS <= 0:
+        with timer(CALL_SECONDS, call="check_password_hash"):
+            return check_password_hash(pwhash, password)
+    if not _slots.acquire(blocking=False):
+        return None
+    try:
+        with timer(CALL_SECONDS, call="check_password_hash"):
+            pool = _pool()
+            try:
+                return pool.submit(check_password_hash, pwhash, password).result()
+            except BrokenProcessPool:
+                # процесс пула убит (OOM и т.п.) — пересоздаём и пробуем ещё раз
+                _reset_pool(pool)
+                return _pool().submit(check_password_hash, pwhash, password).result()
+    finally:
+        _slots.release()
+
+
+class LoginThrottle:
+    """Скользящее окно попыток по ключу (IP): не больше max_attempts за window секунд."""
+    def __init__(self, max_attempts: int = AUTH_MAX_ATTEMPTS, window: int = AUTH_WINDOW_SECONDS):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._hits = {}        # ключ -> времена попыток в окне, по возрастанию
+        self._lock = threading.Lock()
+        self._since_prune = 0
+
+    def hit(self, key: str) -> float:
+        """Учесть попытку; 0 — можно проверять пароль, иначе через сколько секунд повторить."""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            hits = [t for t in self._hits.get(key, ()) if t > now - self.window]
+            if len(hits) >= self.max_attempts:
+                self._hits[key] = hits
+                return max(1.0, hits[0] + self.window - now)   # отклонённая попытка окно не продлевает
+            hits.append(now)
+            self._hits[key] = hits
+            return 0
+
+    def reset(self, key: str):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _prune(self, now: float):
+        # боты с тысячами адресов не должны раздувать словарь: изредка выкидываем истёкшие
+        self._since_prune += 1
+        if self._since_prune < 1000:
+            return
+        self._since_prune = 0
+        self._hits = {k: v for k, v in self._hits.items() if v and v[-1] > now - self.window}
+
+
+login_throttle = LoginThrottle()
+
+
+def init_proxy(app):
+    """За AUTH_TRUST_PROXY прокси remote_addr берётся из X-Forwarded-For (справа, см. выше)."""
+    if AUTH_TRUST_PROXY > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=AUTH_TRUST_PROXY)
+
+
+def client_ip() -> str:
+    return request.remote_addr or ""
+
+
+def too_many_attempts(retry_after: float):
+    return (render_template("login.html", error="Слишком много попыток входа. Попробуйте позже."),
+            429, {"Retry-After": str(math.ceil(retry_after))})
@@ -1,24 +1,29 @@
 # logic/china_orders.py
-from flask import request, jsonify
-from pathlib import Path
-import json, uuid
-from datetime import date
+from flask import request, jsonify, Response, stream_with_context
+import uuid
+from datetime import date, datetime, timezone
 from functools import wraps
 
+from logic.store import RecordStore, HashIndex, SortedIndex, GroupSum
+from logic.storage import DATA_DIR, make_storage
+from logic.exporters import MIMETYPES, stream_export
+from logic.events import watch
+from logic.products import products_store, normalized_item, make_sku, sku_key, merge_product, store_find_by_sku
+
 # --- Файл для хранения заказов ---
-DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-DATA_DIR.mkdir(exist_ok=True)
 CHINA_FILE = DATA_DIR / "china_orders.json"
 
-def load_china_orders():
-    if not CHINA_FILE.exists():
-        CHINA_FILE.write_text("[]", encoding="utf-8")
-    with open(CHINA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+# индексируемые колонки для STORAGE_BACKEND=sqlite
+CHINA_COLUMNS = {
+    "vendor": lambda o: o.get("vendor") or "",
+    "status": lambda o: o.get("status") or "",
+    "date": lambda o: o.get("date") or "",
+}
+china_storage = make_storage(CHINA_FILE, CHINA_COLUMNS)
 
-def save_china_orders(items):
-    with open(CHINA_FILE, "w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
+# резидентная копия заказов; запись — только изменённые заказы (см. logic/store.py)
+china_store = RecordStore(china_storage)
+watch(china_store, "china_orders")   # лента изменений, см. logic/events.py
 
 # --- Утилиты ---
 def one_line(v) -> str:
@@ -37,6 +42,218 @@ def parse_int(v, default=0):
     except Exception:
         return int(default)
 
+def order_status(o) -> str:
+    return one_line(o.get("status")) or "New"
+
+# индексы для фильтров списка и накопительные итоги для /api/china-orders/totals
+china_store.add_index("status", HashIndex(order_status))
+china_store.add_index("vendor", HashIndex(lambda o: one_line(o.get("vendor")).lower()))
+china_store.add_index("date", SortedIndex(lambda o: one_line(o.get("date"))))
+china_store.add_index("totals", GroupSum(
+    lambda o: (order_status(o), one_line(o.get("currency")) or "TJS"),
+    lambda o: parse_float(o.get("total"), 0),
+))
+
+def query_china_orders(args) -> list:
+    """
+    Фильтры: status, vendor (точно), date_from/date_to (YYYY-MM-DD, включительно),
+    q — подстрока поставщика или ID. Порядок — как в хранилище (порядок создания).
+    """
+    store = china_store
+    with store.reading():
+        drivers, preds = [], []
+
+        status = one_line(args.get("status"))
+        if status:
+            bucket = store.index("status").bucket(status)
+            drivers.append((len(bucket), lambda b=bucket: iter(b)))
+            preds.append(lambda o, s=status: order_status(o) == s)
+
+        vendor = one_line(args.get("vendor")).lower()
+        if vendor:
+            bucket = store.index("vendor").bucket(vendor)
+            drivers.append((len(bucket), lambda b=bucket: iter(b)))
+            preds.append(lambda o, v=vendor: one_line(o.get("vendor")).lower() == v)
+
+        d_from, d_to = one_line(args.get("date_from")) or None, one_line(args.get("date_to")) or None
+        if d_from or d_to:
+            idx = store.index("date")
+            start, stop = idx.span(d_from, d_to)
+            drivers.append((stop - start, lambda i=idx, a=d_from, b=d_to: i.ids(a, b)))
+            preds.append(lambda o, a=d_from, b=d_to:
+                         (a is None or one_line(o.get("date")) >= a) and (b is None or one_line(o.get("date")) <= b))
+
+        q = one_line(args.get("q")).lower()
+        if q:
+            preds.append(lambda o, t=q: t in one_line(o.get("vendor")).lower() or t in str(o.get("id") or "").lower())
+
+        if not preds:
+            return list(store.values())
+        if drivers:
+            _, ids = min(drivers, key=lambda d: d[0])
+            candidates = sorted((store.peek(i) for i in ids()), key=lambda o: store.seq(o["id"]))
+        else:
+            candidates = store.values()
+        return [o for o in candidates if all(f(o) for f in preds)]
+
+def china_totals(orders=None) -> dict:
+    """
+    Суммы по валютам, количество по статусам и суммы по статусам.
+    Без списка — из накопительных итогов индекса (без прохода по заказам),
+    со списком (отфильтрованные заказы) — по нему.
+    """
+    if orders is None:
+        # снимок под блокировкой: итоги меняются на месте при записи и при чужих изменениях
+        with china_store.reading():
+            groups = [(key, tuple(g)) for key, g in china_store.index("totals").items()]
+    else:
+        acc = {}
+        for o in orders:
+            g = acc.setdefault((order_status(o), one_line(o.get("currency")) or "TJS"), [0, 0.0])
+            g[0] += 1
+            g[1] += parse_float(o.get("total"), 0)
+        groups = list(acc.items())
+
+    sums, statuses, by_status, count = {}, {}, {}, 0
+    for (status, currency), (n, total) in groups:
+        count += n
+        sums[currency] = sums.get(currency, 0.0) + total
+        statuses[status] = statuses.get(status, 0) + n
+        st = by_status.setdefault(status, {"count": 0, "sums": {}})
+        st["count"] += n
+        st["sums"][currency] = round(st["sums"].get(currency, 0.0) + total, 2)
+    return {
+        "ok": True,
+        "count": count,
+        "sums": {k: round(v, 2) for k, v in sums.items()},
+        "statuses": statuses,
+        "by_status": by_status,
+    }
+
+# --- Приёмка заказа на склад ---
+RECEIVED = "Received"
+RECEIVING = "Receiving"   # приход начат (receipt_id записан), остатки ещё могут быть не учтены
+RECEIPTS_KEEP = 20        # сколько последних приходов помнит товар (поле receipts)
+
+def landed_lines(order) -> list:
+    """
+    Позиции заказа с себестоимостью: доставка (shipping_cost) раскладывается
+    пропорционально сумме позиции (если сумм нет — пропорционально количеству).
+    Для каждой позиции: sku, qty, landed_sum, landed_cost (за единицу).
+    """
+    lines = [it for it in (order.get("items") or []) if isinstance(it, dict)]
+    shipping = parse_float(order.get("shipping_cost"), 0)
+    sums = [parse_float(it.get("sum"), parse_float(it.get("price"), 0) * parse_int(it.get("qty"), 0)) for it in lines]
+    qtys = [max(parse_int(it.get("qty"), 0), 0) for it in lines]
+    weights = sums if sum(sums) > 0 else qtys
+    total_w = sum(weights)
+    out = []
+    for it, line_sum, qty, w in zip(lines, sums, qtys, weights):
+        landed = line_sum + (shipping * w / total_w if total_w else 0.0)
+        out.append({
+            "sku": make_sku(one_line(it.get("brand")).lower(), it.get("model"), it.get("quality")),
+            "brand": it.get("brand"), "model": it.get("model"), "quality": it.get("quality"),
+            "qty": qty,
+            "landed_sum": round(landed, 2),
+            "landed_cost": round(landed / qty, 4) if qty else 0.0,
+        })
+    return out
+
+def average_cost(p, qty: int, unit_cost: float, currency: str):
+    """Средневзвешенная себестоимость товара после прихода (другая валюта — просто последняя)."""
+    old_cost = parse_float(p.get("cost"), 0)
+    old_stock = max(parse_int(p.get("stock"), 0) - qty, 0)   # остаток до прихода
+    if p.get("cost_currency") != currency or old_cost <= 0 or old_stock == 0:
+        return unit_cost
+    return round((old_cost * old_stock + unit_cost * qty) / (old_stock + qty), 4)
+
+def receive_order(order_id: str):
+    """
+    Приход заказа на склад. Позиции сводятся по SKU (make_sku), остатки и себестоимость
+    обновляются одной транзакцией каталога — одна запись в хранилище на весь заказ.
+
+    Каталог и заказы — разные хранилища, общей транзакции у них нет, поэтому по шагам:
+    1) заказу присваивается receipt_id и статус Receiving — это записывается первым;
+    2) товары получают приход и receipt_id в списке receipts; товар, у которого этот
+       receipt_id уже есть, пропускается;
+    3) заказ помечается received_at.
+    Если процесс упал между шагами, повторный вызов берёт тот же receipt_id и доводит
+    приход до конца, не добавляя остаток дважды. После received_at вызов ничего не меняет.
+    Возвращает (заказ, результат) или (None, None), если заказа нет.
+    """
+    with china_store.transaction():
+        o = china_store.get(order_id)
+        if o is None:
+            return None, None
+        if o.get("received_at"):
+            return o, {"already": True, "received_at": o["received_at"]}
+        if not o.get("receipt_id"):
+            o = china_store.put({**o, "status": RECEIVING, "receipt_id": uuid.uuid4().hex})
+    receipt_id = o["receipt_id"]
+
+    currency = one_line(o.get("currency")) or "TJS"
+    lines = landed_lines(o)
+    groups = {}   # sku_key -> [товар для upsert, qty, landed_sum]
+    for ln in lines:
+        key = sku_key(ln["sku"])
+        if not key or ln["qty"] <= 0:
+            continue
+        g = groups.get(key)
+        if g is None:
+            item = normalized_item({"brand": ln["brand"], "model": ln["model"], "quality": ln["quality"],
+                                    "sku": ln["sku"], "vendor": o.get("vendor"), "stock": 0})
+            g = groups[key] = [item, 0, 0.0]
+        g[1] += ln["qty"]
+        g[2] += ln["landed_sum"]
+
+    created = merged = 0
+    product_ids = {}
+    with products_store.transaction():
+        for key, (item, qty, landed_sum) in groups.items():
+            exist = store_find_by_sku(item["sku"])
+            receipts = list((exist.get("receipts") if exist else None) or [])
+            if receipt_id in receipts:
+                product_ids[key] = exist["id"]   # приход уже учтён прошлой (прерванной) попыткой
+                continue
+            item["stock"] = qty
+            # active из normalized_item не переносим: приход не включает скрытый товар
+            rec = merge_product(dict(exist), {k: v for k, v in item.items() if k != "active"}) if exist else item
+            rec["cost"] = average_cost(rec, qty, round(landed_sum / qty, 4), currency)
+            rec["cost_currency"] = currency
+            rec["receipts"] = (receipts + [receipt_id])[-RECEIPTS_KEEP:]
+            product_ids[key] = products_store.put(rec)["id"]
+            created += exist is None
+            merged += exist is not None
+    for ln in lines:
+        if sku_key(ln["sku"]) in product_ids:
+            ln["product_id"] = product_ids[sku_key(ln["sku"])]
+
+    with china_store.transaction():
+        cur = china_store.get(order_id)
+        if cur is None or cur.get("received_at"):
+            # заказ удалили или параллельный вызов уже закончил приход
+            return cur, cur and {"already": True, "received_at": cur["received_at"]}
+        received_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        o = china_store.put({**cur, "status": RECEIVED, "received_at": received_at, "received": lines})
+    return o, {"already": False, "received_at": received_at, "created": created, "merged": merged,
+               "units": sum(g[1] for g in groups.values())}
+
+# --- Выгрузка: CSV/XLSX — строка на позицию заказа, NDJSON — заказ на строку ---
+ORDER_EXPORT_FIELDS = ("id", "date", "vendor", "currency", "status", "shipping_cost", "total", "note")
+LINE_EXPORT_FIELDS = ("brand", "model", "quality", "price", "qty", "sum")
+
+CHINA_EXPORT_COLUMNS = (
+    [(k, lambda r, k=k: order_status(r[0]) if k == "status" else r[0].get(k)) for k in ORDER_EXPORT_FIELDS]
+    + [(k, lambda r, k=k: r[1].get(k)) for k in LINE_EXPORT_FIELDS]
+)
+
+def iter_order_lines(orders):
+    """(заказ, позиция) по одной; заказ без позиций — одна строка с пустыми полями позиции."""
+    for o in orders:
+        lines = [it for it in (o.get("items") or []) if isinstance(it, dict)]
+        for it in lines or [{}]:
+            yield o, it
+
 # --- Декоратор для защиты API (ожидание login_required из app.py) ---
 def with_login_required(app):
     def decorator(func):
@@ -50,10 +267,32 @@ def with_login_required(app):
 
 # --- Регистрация маршрутов ---
 def register_china_orders_routes(app):
-    # Список заказов
+    # Список заказов (фильтры — см. query_china_orders)
     @app.get("/api/china-orders")
     def api_china_orders_list():
-        return jsonify({"ok": True, "items": load_china_orders()})
+        items = query_china_orders(request.args)
+        return jsonify({"ok": True, "items": items, "total": len(items)})
+
+    # Выгрузка с фильтрами списка: export.csv / export.ndjson / export.xlsx
+    @app.get("/api/china-orders/export.<fmt>")
+    def api_china_orders_export(fmt):
+        if fmt not in ("csv", "ndjson", "xlsx"):
+            return jsonify({"error": "unknown format"}), 404
+        orders = query_china_orders(request.args)
+        rows = orders if fmt == "ndjson" else iter_order_lines(orders)
+        resp = Response(
+            stream_with_context(stream_export(fmt, rows, CHINA_EXPORT_COLUMNS, "China orders")),
+            mimetype=MIMETYPES[fmt]
+        )
+        resp.headers["Content-Disposition"] = f'attachment; filename="china_orders.{fmt}"'
+        return resp
+
+    # Итоги: без параметров — из накопительных сумм, с фильтрами списка — по отфильтрованным
+    @app.get("/api/china-orders/totals")
+    def api_china_orders_totals():
+        if any(request.args.get(k) for k in ("q", "status", "vendor", "date_from", "date_to")):
+            return jsonify(china_totals(query_china_orders(request.args)))
+        return jsonify(china_totals())
 
     # Создание нового заказа
     @app.post("/api/china-orders")
@@ -95,31 +334,37 @@ def register_china_orders_routes(app):
             "total": total
         }
 
-        all_orders = load_china_orders()
-        all_orders.append(order)
-        save_china_orders(all_orders)
+        with china_store.transaction():
+            china_store.put(order)
 
         return jsonify({"ok": True, "order": order}), 201
 
     # Удаление заказа
     @app.delete("/api/china-orders/<id>")
     def api_china_orders_delete(id):
-        orders = load_china_orders()
-        new_orders = [o for o in orders if o.get("id") != id]
-        if len(new_orders) == len(orders):
-            return jsonify({"error": "not found"}), 404
-        save_china_orders(new_orders)
+        with china_store.transaction():
+            if not china_store.delete(id):
+                return jsonify({"error": "not found"}), 404
         return jsonify({"ok": True})
 
-    # Обновление статуса заказа
+    # Приход на склад: остатки и себестоимость в каталоге; повторный вызов — без изменений
+    @app.post("/api/china-orders/<id>/receive")
+    def api_china_orders_receive(id):
+        o, result = receive_order(id)
+        if o is None:
+            return jsonify({"error": "not found"}), 404
+        return jsonify({"ok": True, "order": o, **result})
+
+    # Обновление статуса заказа (Received — приход на склад, см. receive_order)
     @app.put("/api/china-orders/<id>/status")
     def api_china_orders_status(id):
         data = request.get_json(silent=True) or {}
         new_status = one_line(data.get("status"))
-        orders = load_china_orders()
-        for o in orders:
-            if o.get("id") == id:
-                o["status"] = new_status or o.get("status")
-                save_china_orders(orders)
-                return jsonify({"ok": True, "order": o})
-        return jsonify({"error": "not found"}), 404
+        if new_status == RECEIVED:
+            return api_china_orders_receive(id)
+        with china_store.transaction():
+            o = china_store.get(id)
+            if o is None:
+                return jsonify({"error": "not found"}), 404
+            o = china_store.put({**o, "status": new_status or o.get("status")})
+        return jsonify({"ok": True, "order": o})
@@ -0,0 +1,190 @@
+# logic/events.py
+"""
+Лента изменений: после каждой записи в хранилище (RecordStore.on_commit) изменённые
+записи попадают в журнал событий data/events.sqlite3, вкладки админки получают их
+по SSE (GET /api/events) и правят свои списки на месте, без перезагрузки всего каталога.
+
+- id события растёт монотонно и общий для всех коллекций и воркеров (SQLite, WAL) —
+  это и есть версия, с которой клиент продолжает: заголовок Last-Event-ID (его шлёт
+  сам EventSource при переподключении) или ?since=<id>;
+- событие: {"id", "collection", "op": "put"|"delete", "rid", "item"} (item — как в списке API);
+- крупная пачка (импорт) — одно событие reset по коллекции: клиенту дешевле перечитать список;
+- старые события подрезаются (EVENTS_KEEP); если клиент отстал сильнее — тоже reset;
+- поток живёт EVENTS_STREAM_SECONDS, потом закрывается, EventSource переподключается
+  с Last-Event-ID сам. Поток держит поток воркера — нужны gthread/gevent (gunicorn.conf.py);
+- открытых потоков на воркер не больше EVENTS_MAX_STREAMS: в gthread это половина
+  GUNICORN_THREADS, чтобы вкладки с лентой не заняли все потоки и API отвечал. Сверх лимита
+  клиент получает пропущенные события сразу, поток закрывается и EventSource приходит
+  снова через EVENTS_BUSY_RETRY_MS — опрос вместо потока (а не 503: на него EventSource
+  больше не переподключается). Для сотен вкладок — gevent, там лимит по умолчанию 1000;
+- ?poll=1 — то же одним JSON-ответом {"events", "last_id", "reset"} (для скриптов и старых браузеров).
+"""
+from flask import request, jsonify, Response, stream_with_context
+from pathlib import Path
+import os, sqlite3, threading, time
+
+from logic import serializer
+from logic.storage import DATA_DIR
+
+EVENTS_PATH = os.getenv("EVENTS_PATH") or str(DATA_DIR / "events.sqlite3")
+EVENTS_KEEP = int(os.getenv("EVENTS_KEEP") or 50000)
+EVENTS_BATCH_MAX = int(os.getenv("EVENTS_BATCH_MAX") or 500)   # больше изменений за транзакцию — reset
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS") or 0.5)
+EVENTS_STREAM_SECONDS = int(os.getenv("EVENTS_STREAM_SECONDS") or 300)
+EVENTS_PAGE = 500
+EVENTS_BUSY_RETRY_MS = int(os.getenv("EVENTS_BUSY_RETRY_MS") or 5000)
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 2000
+
+
+def _default_max_streams() -> int:
+    if os.getenv("GUNICORN_WORKER_CLASS") == "gevent":
+        return 1000
+    return max(1, int(os.getenv("GUNICORN_THREADS") or 8) // 2)   # см. gunicorn.conf.py
+
+
+EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS") or _default_max_streams())
+_stream_slots = threading.BoundedSemaphore(EVENTS_MAX_STREAMS)
+
+
+class EventLog:
+    """Журнал событий в SQLite; соединение — на поток (и заново после fork), схема — при первом обращении."""
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._appends = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "ts REAL NOT NULL, collection TEXT NOT NULL, op TEXT NOT NULL, rid TEXT, data TEXT)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def append(self, rows):
+        """rows: [(collection, op, rid, item|None)] — одной транзакцией."""
+        if not rows:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO events (ts, collection, op, rid, data) VALUES (?, ?, ?, ?, ?)",
+                [(now, c, op, rid, None if item is None else serializer.dumps_str(item)) for c, op, rid, item in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._appends += 1
+        if self._appends % 100 == 0:
+            self.prune()
+
+    def prune(self, keep: int = EVENTS_KEEP):
+        self._conn().execute("DELETE FROM events WHERE id <= ?", (self.last_id() - keep,))
+
+    def last_id(self) -> int:
+        row = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        return row[0] if row else 0
+
+    def first_id(self) -> int:
+        row = self._conn().execute("SELECT MIN(id) FROM events").fetchone()
+        return row[0] if row and row[0] is not None else self.last_id() + 1
+
+    def since(self, last_id: int, limit: int = EVENTS_PAGE) -> list:
+        rows = self._conn().execute(
+            "SELECT id, collection, op, rid, data FROM events WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit))
+        return [{"id": i, "collection": c, "op": op, "rid": rid,
+                 "item": None if data is None else serializer.loads(data)} for i, c, op, rid, data in rows]
+
+
+event_log = EventLog(EVENTS_PATH)
+
+
+def watch(store, collection: str, project=lambda rec: rec):
+    """Писать изменения store в ленту; project(запись) -> то, что увидит клиент (как в списке API)."""
+    @store.on_commit
+    def _emit(puts, deletes):
+        if len(puts) + len(deletes) > EVENTS_BATCH_MAX:
+            event_log.append([(collection, "reset", None, None)])
+            return
+        event_log.append([(collection, "put", r["id"], project(r)) for r in puts]
+                         + [(collection, "delete", rid, None) for rid in deletes])
+
+
+def parse_event_id(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_events(since: int, collections=None, limit: int = EVENTS_PAGE):
+    """(события после since, id последнего прочитанного, нужен ли клиенту полный reset)."""
+    if since < event_log.first_id() - 1 or since > event_log.last_id():
+        return [], event_log.last_id(), True   # нужные события уже подрезаны (или журнал пересоздан)
+    batch = event_log.since(since, limit)
+    cursor = batch[-1]["id"] if batch else since
+    if collections:
+        batch = [e for e in batch if e["collection"] in collections]
+    return batch, cursor, False
+
+
+def sse(event: str, data, id=None) -> str:
+    head = f"id: {id}\n" if id is not None else ""
+    return f"{head}event: {event}\ndata: {serializer.dumps_str(data)}\n\n"
+
+
+def register_events_routes(app):
+    @app.get("/api/events")
+    def api_events():
+        collections = {c for c in (request.args.get("collections") or "").split(",") if c} or None
+        since = parse_event_id(request.headers.get("Last-Event-ID") or request.args.get("since"))
+
+        if request.args.get("poll"):
+            if since is None:
+                return jsonify({"ok": True, "events": [], "last_id": event_log.last_id(), "reset": False})
+            events, cursor, reset = read_events(since, collections)
+            return jsonify({"ok": True, "events": events, "last_id": cursor, "reset": reset})
+
+        def stream(cursor):
+            # слот берём в самом генераторе: отпускает его finally — и по таймауту, и при обрыве клиента
+            live = _stream_slots.acquire(blocking=False)
+            try:
+                yield f"retry: {RETRY_MS if live else EVENTS_BUSY_RETRY_MS}\n\n"
+                if cursor is None:
+                    # новый клиент: с какой версии он читает (списки он загрузит сам)
+                    cursor = event_log.last_id()
+                    yield sse("hello", {"last_id": cursor}, id=cursor)
+                deadline = time.monotonic() + (EVENTS_STREAM_SECONDS if live else 0)
+                beat = time.monotonic() + HEARTBEAT_SECONDS
+                while True:
+                    events, cursor, reset = read_events(cursor, collections)
+                    if reset:
+                        yield sse("reset", {"collections": sorted(collections or [])}, id=cursor)
+                    for e in events:
+                        if e["op"] == "reset":
+                            yield sse("reset", {"collections": [e["collection"]]}, id=e["id"])
+                        else:
+                            yield sse("change", e, id=e["id"])
+                    if events:
+                        continue
+                    if time.monotonic() >= deadline:
+                        break
+                    if time.monotonic() >= beat:
+                        yield ": ping\n\n"   # держим соединение через прокси
+                        beat = time.monotonic() + HEARTBEAT_SECONDS
+                    time.sleep(EVENTS_POLL_SECONDS)
+            finally:
+                if live:
+                    _stream_slots.release()
+
+        resp = Response(stream_with_context(stream(since)), mimetype="text/event-stream")
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.headers["X-Accel-Buffering"] = "no"   # nginx: не буферизовать поток
+        return resp
@@ -0,0 +1,173 @@
+# logic/exporters.py
+"""
+Потоковые выгрузки: генераторы кусков ответа для CSV, NDJSON, JSON-массива и XLSX.
+Строки берутся из итератора по одной, в памяти — только текущий кусок,
+первый байт уходит сразу (Response(stream_with_context(...))).
+"""
+import csv, io, math, re, zipfile
+from xml.sax.saxutils import escape
+
+from logic.serializer import dumps_str
+
+FLUSH_ROWS = 500
+EXPORT_FORMATS = ("json", "csv", "ndjson", "xlsx")
+MIMETYPES = {
+    "json": "application/json; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def stream_json_array(rows, indent=True):
+    """Тот же JSON-массив, что json.dumps(items, indent=2), но по одной записи (indent=False — компактно)."""
+    yield "["
+    first = True
+    for row in rows:
+        body = dumps_str(row, indent=indent)
+        if indent:
+            body = "\n" + "\n".join("  " + line for line in body.split("\n"))
+        yield body if first else "," + body
+        first = False
+    yield "\n]" if (indent and not first) else "]"
+
+
+def stream_ndjson(rows):
+    buf = []
+    for row in rows:
+        buf.append(dumps_str(row))
+        if len(buf) >= FLUSH_ROWS:
+            yield "\n".join(buf) + "\n"
+            buf = []
+    if buf:
+        yield "\n".join(buf) + "\n"
+
+
+def stream_csv(rows, columns):
+    """columns: [(заголовок, функция(row) -> значение)]. BOM в начале — чтобы Excel понял UTF-8."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow([h for h, _ in columns])
+    yield "\ufeff" + out.getvalue()
+    out.seek(0)
+    out.truncate()
+    n = 0
+    for row in rows:
+        writer.writerow([_cell(get(row)) for _, get in columns])
+        n += 1
+        if n % FLUSH_ROWS == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue()
+
+
+def _cell(v):
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    if isinstance(v, (list, tuple)):
+        return ", ".join(str(x) for x in v)
+    return v
+
+
+# ---------- XLSX без openpyxl: zip пишется потоком, строки листа — inline-строки ----------
+_XML_BAD = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _workbook(sheet_name: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    )
+
+
+def _xlsx_cell(v) -> str:
+    v = _cell(v)
+    if isinstance(v, (int, float)) and math.isfinite(v):
+        return f"<c><v>{v}</v></c>"
+    text = escape(_XML_BAD.sub("", str(v)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values) -> str:
+    return "<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>"
+
+
+class _Sink:
+    """Приёмник для ZipFile: копит байты, генератор их забирает. tell() нет — zipfile пишет без seek."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks = []
+        return out
+
+
+def stream_xlsx(rows, columns, sheet_name="Sheet1"):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _workbook(sheet_name))
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(_xlsx_row([h for h, _ in columns]).encode("utf-8"))
+            buf, n = [], 0
+            for row in rows:
+                buf.append(_xlsx_row([get(row) for _, get in columns]))
+                n += 1
+                if n % FLUSH_ROWS == 0:
+                    sheet.write("".join(buf).encode("utf-8"))
+                    buf = []
+                    yield sink.drain()
+            sheet.write("".join(buf).encode("utf-8"))
+            sheet.write(b"</sheetData></worksheet>")
+        yield sink.drain()
+    yield sink.drain()  # центральный каталог zip
+
+
+def stream_export(fmt: str, rows, columns, sheet_name="Sheet1"):
+    if fmt == "csv":
+        return stream_csv(rows, columns)
+    if fmt == "ndjson":
+        return stream_ndjson(rows)
+    if fmt == "xlsx":
+        return stream_xlsx(rows, columns, sheet_name)
+    return stream_json_array(rows)
@@ -0,0 +1,127 @@
+# logic/http_cache.py
+"""
+Условные GET и кэш готовых ответов для read-эндпоинтов каталога.
+
+ETag строится из штампа хранилища (один и тот же во всех воркерах gunicorn),
+имени эндпоинта и параметров запроса — совпал If-None-Match, отвечаем 304 без
+сборки ответа. Собранные тела держим в небольшом LRU по ключу
+(эндпоинт, параметры, версия данных); новая версия — старые ключи просто
+вытесняются.
+"""
+from flask import request, Response
+from collections import OrderedDict
+import hashlib, os, threading
+
+from logic.serializer import COMPRESS_MIN_BYTES, compress, negotiate_encoding
+from logic.metrics import register_collector
+
+HTTP_CACHE_ENTRIES = int(os.getenv("HTTP_CACHE_ENTRIES") or 64)
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_MB") or 32) * 1024 * 1024
+
+
+class ResponseCache:
+    """LRU тел ответов: ограничение по числу записей и по суммарному размеру."""
+    def __init__(self, max_entries: int = HTTP_CACHE_ENTRIES, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()   # ключ -> (тело, mimetype)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body: bytes, mimetype: str):
+        # одно тело не должно вытеснять весь кэш
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._data[key] = (body, mimetype)
+            self._bytes += len(body)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (b, _) = self._data.popitem(last=False)
+                self._bytes -= len(b)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+response_cache = ResponseCache()
+
+
+@register_collector
+def _cache_metrics():
+    return [
+        ("http_response_cache_hits_total", "counter", "Response cache hits.", response_cache.hits),
+        ("http_response_cache_misses_total", "counter", "Response cache misses.", response_cache.misses),
+        ("http_response_cache_bytes", "gauge", "Bytes held by the response cache.", response_cache._bytes),
+    ]
+
+
+def query_key() -> tuple:
+    """Параметры запроса в каноническом виде (порядок не важен)."""
+    return tuple(sorted(request.args.items(multi=True)))
+
+
+def make_etag(endpoint: str, params: tuple, stamp) -> str:
+    raw = repr((endpoint, params, stamp)).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+def cached_json(endpoint: str, store, build):
+    """
+    Ответ read-эндпоинта по данным store (или кортежа хранилищ): build() -> Response (обычно jsonify(...)).
+    304 — если у клиента актуальная версия, тело из кэша — если его уже собирали.
+    """
+    params = query_key()
+    version, stamp = [], []
+    for st in (store if isinstance(store, tuple) else (store,)):
+        with st.reading():
+            version.append(st.version())
+            stamp.append(st.stamp())
+    version, stamp = tuple(version), tuple(stamp)
+    etag = make_etag(endpoint, params, stamp)
+
+    encoding = None
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        key = (endpoint, params, version)
+        entry = response_cache.get(key)
+        if entry is None:
+            built = build()
+            if built.status_code != 200:
+                return built
+            entry = (built.get_data(), built.mimetype)
+            response_cache.put(key, *entry)
+        body, mimetype = entry
+        # сжатое тело тоже кэшируем — повторный запрос не жмёт заново
+        encoding = negotiate_encoding() if len(body) >= COMPRESS_MIN_BYTES else None
+        if encoding:
+            packed = response_cache.get(key + (encoding,))
+            if packed is None:
+                packed = (compress(body, encoding), mimetype)
+                response_cache.put(key + (encoding,), *packed)
+            body = packed[0]
+        resp = Response(body, mimetype=mimetype)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+
+    # сжатый ответ — другие байты, поэтому ETag слабый (сравнение в If-None-Match всё равно слабое)
+    resp.set_etag(etag, weak=bool(encoding))
+    # закрытые данные: браузер хранит у себя, но перед использованием сверяется с сервером
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
@@ -0,0 +1,166 @@
+# logic/images.py
+"""
+Уменьшенные копии фото из public/images: /images/<path>?w=320[&fmt=webp].
+
+- ширина приводится к ближайшей из IMAGE_WIDTHS (не больше), чтобы вариантов было конечное число;
+- WebP — по ?fmt=webp или если браузер прислал image/webp в Accept;
+- готовые варианты лежат в data/image_cache, ключ включает mtime/размер исходника —
+  заменили файл, и старый вариант просто больше не используется;
+- генерация идёт в ограниченном пуле потоков, одинаковые запросы ждут одну задачу.
+
+Pillow — необязательная зависимость: без неё (или если файл не читается как картинка)
+отдаётся оригинал. Импортируется при первом ресайзе, а не при старте воркера.
+"""
+from flask import request, send_file, send_from_directory, abort
+from werkzeug.security import safe_join
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib, os, threading
+
+from logic.storage import DATA_DIR
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+IMAGES_DIR = BASE_DIR / "public" / "images"
+IMAGE_CACHE_DIR = DATA_DIR / "image_cache"
+
+IMAGE_WIDTHS = (64, 128, 200, 320, 480, 640, 800, 1200)
+THUMB_WIDTH = 320
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS") or 2)
+IMAGE_MAX_AGE = 30 * 86400          # варианты и оригиналы кэшируются браузером на 30 дней
+IMAGE_WAIT_SECONDS = 30
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+_SAVE = {
+    "webp": ("WEBP", "image/webp", {"quality": WEBP_QUALITY, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}),
+    "png": ("PNG", "image/png", {"optimize": True}),
+}
+
+_PIL = None                         # (Image, ImageOps) после первого обращения; False — Pillow нет
+_executor = None
+_executor_lock = threading.Lock()
+_pending = {}                       # ключ варианта -> Future (одна генерация на ключ)
+_pending_lock = threading.Lock()
+
+
+def _pillow():
+    global _PIL
+    if _PIL is None:
+        try:
+            from PIL import Image, ImageOps
+            _PIL = (Image, ImageOps)
+        except ImportError:
+            _PIL = False
+    return _PIL
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="img")
+        return _executor
+
+
+def snap_width(w) -> int:
+    """Ближайшая допустимая ширина не больше запрошенной; 0 — без уменьшения."""
+    try:
+        w = int(w)
+    except (TypeError, ValueError):
+        return 0
+    if w <= 0:
+        return 0
+    fits = [x for x in IMAGE_WIDTHS if x <= w]
+    return fits[-1] if fits else IMAGE_WIDTHS[0]
+
+
+def wants_webp() -> bool:
+    fmt = (request.args.get("fmt") or "").lower()
+    if fmt:
+        return fmt == "webp"
+    return "image/webp" in (request.headers.get("Accept") or "")
+
+
+def _out_format(src: Path, webp: bool) -> str:
+    if webp:
+        return "webp"
+    ext = src.suffix.lower()
+    if ext in (".jpg", ".jpeg"):
+        return "jpeg"
+    return "webp" if ext == ".webp" else "png"
+
+
+def variant_path(src: Path, width: int, fmt: str) -> Path:
+    st = src.stat()
+    rel = src.relative_to(IMAGES_DIR).as_posix()
+    key = hashlib.sha1(f"{rel}|{st.st_mtime_ns}|{st.st_size}|{width}|{fmt}".encode("utf-8")).hexdigest()
+    return IMAGE_CACHE_DIR / key[:2] / f"{key}.{fmt}"
+
+
+def _render(src: Path, dst: Path, width: int, fmt: str) -> Path:
+    if dst.exists():
+        return dst
+    pil_format, _, opts = _SAVE[fmt]
+    Image, ImageOps = _pillow()
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.width > width:
+            im.thumbnail((width, im.height), Image.LANCZOS)
+        if fmt == "jpeg" and im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        elif im.mode not in ("RGB", "RGBA", "L", "LA"):
+            im = im.convert("RGBA")
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            im.save(tmp, pil_format, **opts)
+            os.replace(tmp, dst)
+        finally:
+            tmp.unlink(missing_ok=True)
+    return dst
+
+
+def make_variant(src: Path, width: int, fmt: str) -> Path:
+    """Путь к готовому варианту; при промахе — генерация в пуле (ждём не дольше IMAGE_WAIT_SECONDS)."""
+    dst = variant_path(src, width, fmt)
+    if dst.exists():
+        return dst
+    with _pending_lock:
+        fut = _pending.get(dst)
+        if fut is None:
+            fut = _pending[dst] = _pool().submit(_render, src, dst, width, fmt)
+            fut.add_done_callback(lambda f, k=dst: _pending.pop(k, None))
+    return fut.result(timeout=IMAGE_WAIT_SECONDS)
+
+
+def serve_image(filename: str):
+    """Ответ для /images/<path>: вариант по ?w= или оригинал."""
+    fp = safe_join(str(IMAGES_DIR), filename)
+    if fp is None or not os.path.isfile(fp):
+        abort(404)
+    src = Path(fp)
+    width = snap_width(request.args.get("w"))
+
+    if width and _pillow():
+        webp = wants_webp()
+        fmt = _out_format(src, webp)
+        try:
+            out = make_variant(src, width, fmt)
+        except Exception:
+            out = None   # не картинка / битый файл / таймаут — отдаём как есть
+        if out is not None:
+            resp = send_file(out, mimetype=_SAVE[fmt][1], max_age=IMAGE_MAX_AGE, etag=out.stem, conditional=True)
+            if not request.args.get("fmt"):
+                resp.vary.add("Accept")
+            return resp
+
+    return send_from_directory(IMAGES_DIR, filename, max_age=IMAGE_MAX_AGE)
+
+
+def thumb_src(url: str, width: int = THUMB_WIDTH) -> str:
+    """URL уменьшенной копии для локальных /images/...; внешние ссылки — без изменений."""
+    if not url.startswith("/images/") or "?" in url:
+        return url
+    return f"{url}?w={width}"
+
@@ -0,0 +1,172 @@
+# logic/importer.py
+"""
+Потоковый разбор файлов импорта: JSON-массив, NDJSON, CSV.
+Строки отдаются по одной, весь файл в памяти не держим.
+Битая строка отдаётся как BadRow — импорт продолжается, ошибка попадает в отчёт.
+Кодировка — encoding (по умолчанию UTF-8, BOM допускается); файл не в ней — ImportFormatError
+(Excel в русской Windows сохраняет CSV в cp1251 — для него ?encoding=cp1251).
+"""
+import codecs, csv, io, json, re
+
+CHUNK_SIZE = 64 * 1024
+FORMATS = ("json", "ndjson", "csv")
+DEFAULT_ENCODING = "utf-8-sig"
+
+_WS = re.compile(r"\s*")
+
+
+class ImportFormatError(ValueError):
+    """Файл целиком не того формата (не массив, обрыв JSON и т.п.)."""
+
+
+class BadRow:
+    def __init__(self, error: str):
+        self.error = error
+
+
+def detect_format(content_type: str = "", filename: str = "", explicit: str = "") -> str:
+    fmt = (explicit or "").strip().lower()
+    if fmt in FORMATS:
+        return fmt
+    name = (filename or "").lower()
+    ct = (content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in ct or "jsonl" in ct:
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in ct:
+        return "csv"
+    return "json"
+
+
+def valid_encoding(name: str) -> bool:
+    try:
+        codecs.lookup(name)
+    except LookupError:
+        return False
+    return True
+
+
+def _binary(stream):
+    # TextIOWrapper нужен буферизованный поток; сырой поток запроса оборачиваем
+    return stream if hasattr(stream, "read1") else io.BufferedReader(stream, CHUNK_SIZE)
+
+
+def iter_json_array(stream, chunk_size: int = CHUNK_SIZE, encoding: str = DEFAULT_ENCODING):
+    """Элементы JSON-массива верхнего уровня по мере чтения потока."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(encoding)()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            buf = buf[pos:] + text.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + text.decode(chunk)
+        pos = 0
+
+    def next_char():
+        # пропускаем пробелы, дочитывая поток; None — конец данных
+        nonlocal pos
+        while True:
+            pos = _WS.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return None
+            fill()
+
+    if next_char() != "[":
+        raise ImportFormatError("expect array")
+    pos += 1
+
+    first = True
+    while True:
+        ch = next_char()
+        if ch == "]":
+            return
+        if ch is None:
+            raise ImportFormatError("unexpected end of data")
+        if not first:
+            if ch != ",":
+                raise ImportFormatError(f"unexpected {ch!r} at array level")
+            pos += 1
+            next_char()
+        first = False
+
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise ImportFormatError("invalid json")
+                fill()  # значение ещё не дочитано
+                continue
+            if end == len(buf) and not eof:
+                fill()  # число могло оборваться на границе блока — перечитаем целиком
+                continue
+            pos = end
+            yield obj
+            break
+
+
+def iter_ndjson(stream, encoding: str = DEFAULT_ENCODING):
+    text = io.TextIOWrapper(_binary(stream), encoding=encoding)
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield BadRow("invalid json")
+
+
+def iter_csv(stream, encoding: str = DEFAULT_ENCODING):
+    """CSV с заголовком; разделитель «,» или «;» (Excel в русской локали) — по строке заголовка."""
+    text = io.TextIOWrapper(_binary(stream), encoding=encoding, newline="")
+    header = text.readline()
+    if not header.strip():
+        return
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    names = [h.strip().lower() for h in next(csv.reader([header], delimiter=delimiter))]
+    for values in csv.reader(text, delimiter=delimiter):
+        if not any(v.strip() for v in values):
+            continue
+        if len(values) > len(names):
+            yield BadRow(f"{len(values)} columns, header has {len(names)}")
+            continue
+        yield {k: v for k, v in zip(names, values) if k and v != ""}
+
+
+def iter_rows(stream, fmt: str, encoding: str = DEFAULT_ENCODING):
+    if fmt == "ndjson":
+        rows = iter_ndjson(stream, encoding)
+    elif fmt == "csv":
+        rows = iter_csv(stream, encoding)
+    else:
+        rows = iter_json_array(stream, encoding=encoding)
+    try:
+        yield from rows
+    except UnicodeDecodeError:
+        # декодируется блоками — строку не назовём, но строки до этого блока уже отданы
+        name = "utf-8" if encoding == DEFAULT_ENCODING else encoding
+        raise ImportFormatError(f"file is not {name} text, set ?encoding= (e.g. cp1251)")
+
+
+def batched(it, size: int):
+    batch = []
+    try:
+        for x in it:
+            batch.append(x)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    except ImportFormatError:
+        # файл оборвался посреди пачки: разобранные до ошибки строки не теряем
+        if batch:
+            yield batch
+        raise
+    if batch:
+        yield batch
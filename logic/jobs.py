@@ -0,0 +1,152 @@
+# logic/jobs.py
+"""
+Фоновые задачи (импорт/экспорт) в пуле потоков воркера.
+Состояние задачи — JSON-файл в data/jobs/, поэтому опрашивать /api/jobs/<id>
+можно через любой воркер gunicorn. Готовые файлы (артефакты) лежат там же.
+"""
+from flask import jsonify, send_file, abort
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import json, os, re, threading, time, traceback, uuid
+
+from logic.storage import DATA_DIR, atomic_write_text
+
+JOBS_DIR = DATA_DIR / "jobs"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS") or 2)
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_DAYS") or 7) * 86400
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        return _executor
+
+
+def _state_path(job_id: str) -> Path:
+    return JOBS_DIR / f"{job_id}.json"
+
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+
+class Job:
+    """Ручка задачи, которую получает функция-исполнитель."""
+    def __init__(self, state: dict):
+        self.state = state
+
+    @property
+    def id(self) -> str:
+        return self.state["id"]
+
+    def _write(self):
+        self.state["updated_at"] = time.time()
+        atomic_write_text(_state_path(self.id), json.dumps(self.state, ensure_ascii=False))
+
+    def progress(self, **fields):
+        self.state["progress"] = {**(self.state.get("progress") or {}), **fields}
+        self._write()
+
+    def path(self, suffix: str) -> Path:
+        """Файл задачи в data/jobs/ (загрузка, артефакт); suffix не должен быть просто ".json" — это файл состояния."""
+        return JOBS_DIR / f"{self.id}{suffix}"
+
+    def set_artifact(self, path: Path, filename: str, mimetype: str):
+        self.state["artifact"] = {"file": Path(path).name, "filename": filename, "mimetype": mimetype}
+
+
+def _prune():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for fp in JOBS_DIR.iterdir():
+        try:
+            if fp.stat().st_mtime < cutoff:
+                fp.unlink()
+        except OSError:
+            pass
+
+
+def new_job(kind: str) -> Job:
+    """Создать задачу в статусе queued (файлы можно подготовить до submit)."""
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    _prune()
+    job = Job({
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",
+        "progress": {},
+        "result": None,
+        "error": None,
+        "artifact": None,
+        "created_at": time.time(),
+        "pid": os.getpid(),
+    })
+    job._write()
+    return job
+
+
+def submit(job: Job, fn, *args, **kwargs) -> Job:
+    """fn(job, *args, **kwargs) -> результат (JSON) выполняется в пуле потоков."""
+    def run():
+        job.state.update(status="running", started_at=time.time(), pid=os.getpid())
+        job._write()
+        try:
+            result = fn(job, *args, **kwargs)
+            job.state.update(status="done", result=result)
+        except Exception as e:
+            traceback.print_exc()
+            job.state.update(status="failed", error=str(e) or e.__class__.__name__)
+        job.state["finished_at"] = time.time()
+        job._write()
+
+    _pool().submit(run)
+    return job
+
+
+def load_job(job_id: str):
+    if not _ID_RE.match(job_id or ""):
+        return None
+    try:
+        state = json.loads(_state_path(job_id).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    # воркер, который вёл задачу, перезапустили — задача уже не завершится
+    if state.get("status") in ("queued", "running") and not _pid_alive(state.get("pid")):
+        state.update(status="failed", error="worker exited")
+    return state
+
+
+def public_state(state: dict) -> dict:
+    out = {k: v for k, v in state.items() if k not in ("pid", "artifact")}
+    if state.get("artifact") and state.get("status") == "done":
+        out["artifact_url"] = f"/api/jobs/{state['id']}/artifact"
+    return out
+
+
+def register_jobs_routes(app):
+    @app.get("/api/jobs/<job_id>")
+    def api_job_status(job_id):
+        state = load_job(job_id)
+        if state is None:
+            return jsonify({"error": "not found"}), 404
+        return jsonify({"ok": True, "job": public_state(state)})
+
+    @app.get("/api/jobs/<job_id>/artifact")
+    def api_job_artifact(job_id):
+        state = load_job(job_id)
+        art = (state or {}).get("artifact")
+        if not art or state.get("status") != "done":
+            abort(404)
+        fp = JOBS_DIR / art["file"]
+        if not fp.exists():
+            abort(404)
+        return send_file(fp, mimetype=art["mimetype"], as_attachment=True, download_name=art["filename"])
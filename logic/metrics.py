@@ -0,0 +1,207 @@
+# logic/metrics.py
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics) без сторонних библиотек.
+
+- http_request_duration_seconds{method,route,status} — латентность по шаблону маршрута;
+- http_response_size_bytes{route} — размер тела (после сжатия; потоковые ответы не считаются);
+- storage_duration_seconds{collection,op} — чтение/запись хранилищ: все чтения и записи
+  каталога и заказов идут через RecordStore, op = load|changes|write;
+- call_duration_seconds{call} — функции с декоратором @timed (поиск) и вызовы под timer(),
+  например check_password_hash;
+- app_startup_seconds{phase} — create_app и прогрев каталога (см. app.py, gunicorn.conf.py).
+
+Значения — на процесс: каждый воркер gunicorn отдаёт свои, суммирует Prometheus.
+METRICS_TOKEN — если задан, /metrics требует Authorization: Bearer <token>.
+
+Профилировщик по запросу: при заданном PROFILE_TOKEN запрос с заголовком
+X-Profile: <token> выполняется под cProfile, дамп — в data/profiles/ (имя файла
+в заголовке ответа X-Profile-File; смотреть через python -m pstats или snakeviz).
+"""
+from flask import request, g, Response, abort
+from functools import wraps
+import cProfile, os, re, threading, time
+
+from logic.storage import DATA_DIR
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or ""
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or ""
+PROFILES_DIR = DATA_DIR / "profiles"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_START_TIME = time.time()
+_startup = {}      # фаза старта -> секунды (с preload_app значения наследуют все воркеры)
+
+
+class Histogram:
+    """Семейство гистограмм с метками: observe(значение, **метки)."""
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}      # кортеж меток -> [счётчики по бакетам..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            series = [(k, list(v)) for k, v in self._series.items()]
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, s in sorted(series):
+            for b, n in zip(self.buckets, s):
+                out.append(f"{self.name}_bucket{_labels(key, le=_num(b))} {n}")
+            out.append(f'{self.name}_bucket{_labels(key, le="+Inf")} {s[-1]}')
+            out.append(f"{self.name}_sum{_labels(key)} {s[-2]:.6f}")
+            out.append(f"{self.name}_count{_labels(key)} {s[-1]}")
+        return out
+
+
+def _num(x) -> str:
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key, **extra) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route template.")
+RESPONSE_BYTES = Histogram("http_response_size_bytes", "Response body size by route template.", SIZE_BUCKETS)
+STORAGE_SECONDS = Histogram("storage_duration_seconds", "Time spent loading/writing a storage backend.")
+CALL_SECONDS = Histogram("call_duration_seconds", "Time spent in instrumented functions.")
+
+_HISTOGRAMS = [REQUEST_SECONDS, RESPONSE_BYTES, STORAGE_SECONDS, CALL_SECONDS]
+_collectors = []   # функции -> [(имя, тип, help, значение)] для счётчиков из других модулей
+
+
+def register_collector(fn):
+    _collectors.append(fn)
+    return fn
+
+
+class timer:
+    """with timer(STORAGE_SECONDS, collection="products", op="load"): ..."""
+    def __init__(self, hist: Histogram, **labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, **self.labels)
+
+
+def timed(call: str):
+    """Декоратор: время выполнения функции в call_duration_seconds{call=...}."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapped(*args, **kwargs):
+            with timer(CALL_SECONDS, call=call):
+                return fn(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def record_startup(phase: str, seconds: float):
+    _startup[phase] = seconds
+
+
+def render_metrics() -> str:
+    lines = []
+    for h in _HISTOGRAMS:
+        lines += h.render()
+    for fn in _collectors:
+        for name, kind, help, value in fn():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    lines += [
+        "# HELP process_start_time_seconds Start time of the process since unix epoch.",
+        "# TYPE process_start_time_seconds gauge",
+        f"process_start_time_seconds {_START_TIME:.3f}",
+    ]
+    if _startup:
+        lines += ["# HELP app_startup_seconds Time spent in startup phases (create_app, catalog warm-up).",
+                  "# TYPE app_startup_seconds gauge"]
+        lines += [f"app_startup_seconds{_labels((('phase', k),))} {v:.6f}" for k, v in sorted(_startup.items())]
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Профилировщик по заголовку ----------
+_profile_lock = threading.Lock()   # один профилируемый запрос за раз (cProfile глобален для потока/интерпретатора)
+
+
+def _start_profile():
+    if not PROFILE_TOKEN or request.headers.get("X-Profile") != PROFILE_TOKEN:
+        return
+    if not _profile_lock.acquire(blocking=False):
+        return
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError:   # уже работает другой профилировщик
+        _profile_lock.release()
+        return
+    g._profile = prof
+
+
+def _finish_profile(resp):
+    prof = g.pop("_profile", None)
+    if prof is None:
+        return
+    try:
+        prof.disable()
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        route = re.sub(r"[^A-Za-z0-9]+", "_", request.path).strip("_") or "root"
+        fp = PROFILES_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{route}.prof"
+        prof.dump_stats(fp)
+        resp.headers["X-Profile-File"] = fp.name
+    finally:
+        _profile_lock.release()
+
+
+def init_metrics(app):
+    """
+    Хуки замера запросов и маршрут /metrics. Вызывать до init_compression:
+    after_request выполняются в обратном порядке, так размер считается уже сжатого тела.
+    """
+    @app.before_request
+    def _metrics_start():
+        g._t0 = time.perf_counter()
+        _start_profile()
+
+    @app.after_request
+    def _metrics_finish(resp):
+        _finish_profile(resp)
+        t0 = g.pop("_t0", None)
+        if t0 is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            REQUEST_SECONDS.observe(time.perf_counter() - t0,
+                                    method=request.method, route=route, status=resp.status_code)
+            if not resp.is_streamed and resp.content_length is not None:
+                RESPONSE_BYTES.observe(resp.content_length, route=route)
+        return resp
+
+    @app.get("/metrics")
+    def metrics():
+        if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+            abort(401)
+        return Response(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
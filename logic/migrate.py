@@ -0,0 +1,38 @@
+# logic/migrate.py
+"""
+Разовый перенос JSON-хранилищ (data/products.json, data/china_orders.json,
+data/brands.json, с учётом журналов) в SQLite.
+
+    python -m logic.migrate [--force] [--db data/admin.sqlite3]
+
+Потом запускать приложение с STORAGE_BACKEND=sqlite.
+"""
+import argparse, sys, uuid
+
+from logic.storage import JournalStorage, SqliteStorage, SQLITE_PATH
+from logic.products import PRODUCTS_FILE, PRODUCT_COLUMNS, BRANDS_FILE
+from logic.china_orders import CHINA_FILE, CHINA_COLUMNS
+
+
+def migrate(db_path=SQLITE_PATH, force=False, out=sys.stdout):
+    for path, columns in ((PRODUCTS_FILE, PRODUCT_COLUMNS), (CHINA_FILE, CHINA_COLUMNS), (BRANDS_FILE, None)):
+        # JournalStorage читает снимок и доигрывает журнал, если он есть
+        items = JournalStorage(path).load()
+        for rec in items:
+            if not rec.get("id"):
+                rec["id"] = str(uuid.uuid4())
+        target = SqliteStorage(db_path, path.stem, columns)
+        existing = len(target.load())
+        if existing and not force:
+            print(f"{path.stem}: в базе уже {existing} записей, пропуск (--force для перезаписи)", file=out)
+            continue
+        target.save(items)
+        print(f"{path.stem}: перенесено {len(items)}", file=out)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="JSON -> SQLite")
+    ap.add_argument("--db", default=SQLITE_PATH)
+    ap.add_argument("--force", action="store_true")
+    args = ap.parse_args()
+    migrate(args.db, args.force)
@@ -1,25 +1,34 @@
 # logic/products.py
-from flask import request, jsonify, Response, send_from_directory, abort
+from flask import request, jsonify, Response, stream_with_context
 from pathlib import Path
-import json, uuid
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from operator import attrgetter
+import json, uuid, hashlib, base64, math, re, shutil, sys, threading, time
+
+from logic import serializer
+from logic.store import RecordStore, HashIndex, MultiKeyIndex, SortedIndex, GroupSum, Projection
+from logic.storage import DATA_DIR, make_storage
+from logic.search import SearchIndex
+from logic.importer import ImportFormatError, BadRow, DEFAULT_ENCODING, detect_format, iter_rows, batched, valid_encoding
+from logic.jobs import new_job, submit
+from logic.exporters import EXPORT_FORMATS, MIMETYPES, stream_export
+from logic.http_cache import cached_json
+from logic.images import serve_image, thumb_src
+from logic.metrics import timed
+from logic.events import watch
 
 # ---------- Хранилище ----------
-DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-DATA_DIR.mkdir(exist_ok=True)
 PRODUCTS_FILE = DATA_DIR / "products.json"
+BRANDS_FILE = DATA_DIR / "brands.json"     # настройки брендов: порядок, цвет, название, активность
 
-def _ensure_file(fp: Path, default_json: str = "[]"):
-    if not fp.exists():
-        fp.write_text(default_json, encoding="utf-8")
-
-def load_products():
-    _ensure_file(PRODUCTS_FILE, "[]")
-    with open(PRODUCTS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_products(items):
-    with open(PRODUCTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
+# индексируемые колонки для STORAGE_BACKEND=sqlite
+PRODUCT_COLUMNS = {
+    "sku": lambda p: " ".join(f"{p.get('sku') or ''}".split()).lower(),
+    "brand": lambda p: (p.get("brand") or "").strip().lower(),
+    "vendor": lambda p: p.get("vendor") or "",
+}
+products_storage = make_storage(PRODUCTS_FILE, PRODUCT_COLUMNS)
 
 # ---------- Утилиты ----------
 def one_line(v) -> str:
@@ -84,6 +93,33 @@ def make_sku(brand: str, model: str, quality: str) -> str:
     parts = [p for p in (b, m, q) if p]
     return "-".join(parts)
 
+def parse_barcodes(raw) -> list:
+    """Штрихкоды: список или строка через запятую/точку с запятой/пробел; без пустых и повторов."""
+    if isinstance(raw, (list, tuple)):
+        codes = [one_line(c) for c in raw]
+    else:
+        codes = re.split(r"[,;\s]+", one_line(raw))
+    return list(dict.fromkeys(c for c in codes if c))
+
+_created_lock = threading.Lock()
+_last_created = 0
+
+def next_created_seq() -> int:
+    """
+    Порядковый номер создания товара — хранится в записи (created_seq), сортировка
+    «по созданию» и её курсоры от него одинаковы во всех воркерах и после перечитывания.
+    Микросекунды времени (ниже 2**53 — JS читает число без потерь), внутри процесса строго растут;
+    совпадение между воркерами не страшно — при равенстве порядок по id.
+    """
+    global _last_created
+    with _created_lock:
+        _last_created = max(time.time_ns() // 1000, _last_created + 1)
+        return _last_created
+
+def created_seq(p) -> int:
+    v = p.get("created_seq")
+    return v if type(v) is int else 0   # старые записи до backfill_created_seq — в начале, по id
+
 def normalized_item(data: dict, *, keep_id: bool = False) -> dict:
     """Нормализуем входные данные в формат хранения."""
     tags_raw = data.get("tags")
@@ -108,10 +144,12 @@ def normalized_item(data: dict, *, keep_id: bool = False) -> dict:
     sku = one_line(data.get("sku"))
     if not sku:
         sku = make_sku(brand, model, quality)
+    barcodes = parse_barcodes(data.get("barcodes") if data.get("barcodes") is not None else data.get("barcode"))
 
     out = {
         "id": (one_line(data.get("id")) if keep_id and data.get("id") else str(uuid.uuid4())),
         "sku": sku,
+        "barcodes": barcodes,
         "brand": brand,
         "model": model,
         "quality": quality,
@@ -124,6 +162,8 @@ def normalized_item(data: dict, *, keep_id: bool = False) -> dict:
         "tags": tags,
         "specs": specs_text,
         "active": active,
+        # правка (keep_id) сохраняет номер создания, новая запись получает следующий
+        "created_seq": created_seq(data) if keep_id and created_seq(data) else next_created_seq(),
     }
     return out
 
@@ -134,6 +174,7 @@ def merge_product(dst: dict, src: dict):
     - stock: суммируем
     - price: если в src есть цена (>0) — обновляем
     - пустые поля в dst заполняем из src
+    - штрихкоды объединяем
     """
     dst["stock"] = int(dst.get("stock") or 0) + int(src.get("stock") or 0)
     if parse_float(src.get("price"), 0) > 0:
@@ -143,6 +184,11 @@ def merge_product(dst: dict, src: dict):
         if not one_line(dst.get(k)):
             dst[k] = src.get(k) or dst.get(k)
 
+    # штрихкоды: объединяем, порядок — сначала старые
+    src_codes = parse_barcodes(src.get("barcodes") or [])
+    if src_codes:
+        dst["barcodes"] = parse_barcodes([*(dst.get("barcodes") or []), *src_codes])
+
     # tags: если в src есть — берём их, иначе оставляем dst
     src_tags = src.get("tags") or []
     if isinstance(src_tags, list) and len(src_tags) > 0:
@@ -169,6 +215,9 @@ def find_by_sku(items: list, sku: str):
             return p
     return None
 
+def sku_key(v) -> str:
+    return one_line(v).lower()
+
 # ---------- Фото: префикс и вычисление URL ----------
 IMAGES_PREFIX = "/images/"
 PLACEHOLDER_IMAGE = "placeholder.png"
@@ -192,14 +241,702 @@ def photo_src(photo) -> str:
         return f"/{s2}"
     return f"{IMAGES_PREFIX}{s2}"
 
-def with_brand_and_photo(p: dict) -> dict:
+# ---------- Компактная запись товара ----------
+_MISSING = object()
+_INTERNED = frozenset(("brand", "quality", "currency", "vendor", "type"))   # мало различных значений
+_NO_CODES = ()      # у большинства товаров штрихкодов нет — один общий пустой кортеж вместо списка на запись
+_PLACEHOLDER_URL = photo_src("")
+_PLACEHOLDER_THUMB = thumb_src(_PLACEHOLDER_URL)
+
+def _reuse(orig, derived):
+    return orig if derived == orig else derived
+
+class ProductRecord(Mapping):
+    """
+    Товар в резидентном каталоге. Поля формата хранения — в __slots__ (в несколько раз
+    меньше памяти, чем dict), плюс производные, посчитанные один раз при записи:
+    sku_key, brand_slug, brand_label, photo_url, thumb_url.
+
+    Ведёт себя как неизменяемый dict: get, [], in, {**p}; в JSON превращается
+    обратно в dict (to_dict, serializer вызывает его сам), лишние поля старых записей
+    хранятся в extra и не теряются. Изменение — только копией: products_store.put({**p, ...}).
+    Раз запись неизменяема, её JSON для файла хранилища считается один раз (to_json):
+    полная перезапись каталога склеивает готовые байты и кодирует только новые записи.
+    """
+    FIELDS = ("id", "sku", "barcodes", "brand", "model", "quality", "price", "currency", "vendor",
+              "photo", "stock", "type", "tags", "specs", "active", "created_seq")
+    __slots__ = FIELDS + ("extra", "sku_key", "brand_slug", "brand_label", "photo_url", "thumb_url", "_json")
+    _FIELD_SET = frozenset(FIELDS)
+
+    @classmethod
+    def from_dict(cls, d) -> "ProductRecord":
+        self = cls.__new__(cls)
+        for f in cls.FIELDS:
+            v = d.get(f, _MISSING)
+            if f in _INTERNED and type(v) is str:
+                v = sys.intern(v)
+            elif f == "barcodes" and not v and v is not _MISSING:
+                v = _NO_CODES
+            setattr(self, f, v)
+        extra = {k: v for k, v in d.items() if k not in cls._FIELD_SET}
+        self.extra = extra or None
+        self._json = None
+
+        # производные строки: совпадающие с исходными не копируем, повторяющиеся — интернируем
+        self.sku_key = _reuse(self.get("sku"), sku_key(self.get("sku")))
+        self.brand_slug = sys.intern(sku_key(self.get("brand")))
+        self.brand_label = sys.intern(title_brand(self.brand_slug) or self.brand_slug.upper())
+        self.photo_url = _reuse(self.get("photo"), photo_src(self.get("photo")))
+        self.thumb_url = _reuse(self.photo_url, thumb_src(self.photo_url))
+        if self.photo_url == _PLACEHOLDER_URL:
+            self.photo_url, self.thumb_url = _PLACEHOLDER_URL, _PLACEHOLDER_THUMB
+        return self
+
+    def get(self, key, default=None):
+        if key in self._FIELD_SET:
+            v = getattr(self, key)
+            return default if v is _MISSING else v
+        return self.extra.get(key, default) if self.extra else default
+
+    def __getitem__(self, key):
+        v = self.get(key, _MISSING)
+        if v is _MISSING:
+            raise KeyError(key)
+        return v
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        for f in self.FIELDS:
+            if getattr(self, f) is not _MISSING:
+                yield f
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> dict:
+        vals = _field_values(self)
+        if any(v is _MISSING for v in vals):
+            out = {f: v for f, v in zip(self.FIELDS, vals) if v is not _MISSING}
+        else:
+            out = dict(zip(self.FIELDS, vals))   # обычный случай — без цикла на Python
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+    def to_json(self) -> bytes:
+        if self._json is None:
+            self._json = serializer.dumps(self.to_dict())
+        return self._json
+
+    def __repr__(self):
+        return f"ProductRecord({self.to_dict()!r})"
+
+_field_values = attrgetter(*ProductRecord.FIELDS)
+
+# ---------- Резидентный каталог с индексами ----------
+products_store = RecordStore(products_storage, ProductRecord)
+products_store.add_index("sku", HashIndex(lambda p: p.sku_key))
+products_store.add_index("brand", HashIndex(lambda p: p.brand_slug))
+products_store.add_index("barcode", MultiKeyIndex(lambda p: [sku_key(c) for c in p.get("barcodes") or ()]))
+products_store.add_index("quality", HashIndex(lambda p: one_line(p.get("quality")).lower()))
+
+def _num_key(v) -> float:
+    x = parse_float(v, 0)
+    return x if math.isfinite(x) else 0.0
+
+# упорядоченные индексы: диапазонные фильтры и сортировка в GET /api/products
+products_store.add_index("price", SortedIndex(lambda p: _num_key(p.get("price"))))
+products_store.add_index("stock", SortedIndex(lambda p: _num_key(p.get("stock"))))
+products_store.add_index("model", SortedIndex(lambda p: one_line(p.get("model")).lower()))
+products_store.add_index("created", SortedIndex(created_seq))   # не seq(): тот свой в каждом процессе
+
+def backfill_created_seq() -> int:
+    """
+    Старым записям без created_seq — номера 1..n в порядке хранения (меньше любых новых).
+    Одна транзакция, повторный вызов ничего не пишет. Вызывается из app.warm_up.
+    """
+    with products_store.transaction():
+        n = 0
+        for i, p in enumerate(list(products_store.values()), 1):
+            if not created_seq(p):
+                products_store.put({**p, "created_seq": i})
+                n += 1
+    return n
+
+# полнотекстовый индекс: те же поля, что раньше склеивались в строку поиска
+products_store.add_index("search", SearchIndex({
+    "sku": (lambda p: p.get("sku"), 3),
+    "barcodes": (lambda p: " ".join(p.get("barcodes") or ()), 3),
+    "model": (lambda p: p.get("model"), 3),
+    "quality": (lambda p: p.get("quality"), 2),
+    "tags": (lambda p: " ".join(f"{t}" for t in (p.get("tags") or [])), 2),
+    "type": (lambda p: p.get("type"), 1),
+    "vendor": (lambda p: p.get("vendor"), 1),   # поиск по поставщику, как в прежнем фильтре на странице
+    "specs": (lambda p: p.get("specs"), 1),
+}))
+
+@timed("search")
+def search_ids(q: str) -> list:
+    """id товаров по запросу: по убыванию релевантности, при равенстве — в порядке хранения."""
+    hits = products_store.index("search").search(q)
+    return [i for _, i in sorted(hits, key=lambda h: (-h[0], products_store.seq(h[1])))]
+
+def store_find_by_sku(sku: str):
+    """Как find_by_sku, но через хеш-индекс каталога — O(1)."""
+    return products_store.index("sku").first(sku_key(sku))
+
+def find_by_code(code: str):
+    """Отсканированный код -> (товар, "sku"|"barcode") или (None, None). Точное совпадение SKU важнее штрихкода."""
+    key = sku_key(code)
+    if not key:
+        return None, None
+    p = products_store.index("sku").first(key)
+    if p is not None:
+        return p, "sku"
+    p = products_store.index("barcode").first(key)
+    return (p, "barcode") if p is not None else (None, None)
+
+def upsert_product(item: dict):
+    """Upsert по SKU внутри открытой транзакции. Возвращает (запись, создана_ли)."""
+    exist = store_find_by_sku(item["sku"])
+    if exist:
+        return products_store.put(merge_product(dict(exist), item)), False
+    return products_store.put(item), True
+
+def update_product(p: dict, data: dict):
+    """
+    Правка товара p полями data внутри открытой транзакции.
+    Возвращает (запись, "updated"|"merged"): если сменили SKU на уже существующий —
+    товар вливается в тот, исходный удаляется.
+    """
+    id = p["id"]
+    updated = normalized_item({**p, **data}, keep_id=True)
+    updated["id"] = id
+
+    # если поменяли SKU и такой SKU уже есть у другого товара — объединим в того
+    if one_line(updated.get("sku")) and sku_key(updated.get("sku")) != sku_key(p.get("sku")):
+        dup = store_find_by_sku(updated["sku"])
+        if dup and dup.get("id") != id:
+            # переносим stock/поля и удаляем исходный
+            merged = products_store.put(merge_product(dict(dup), updated))
+            products_store.delete(id)
+            return merged, "merged"
+
+    # обычное обновление
+    return products_store.put({**p, **updated}), "updated"
+
+def record_etag(p: dict) -> str:
+    """Сильный ETag версии записи — для оптимистичной проверки If-Match на PUT."""
+    return hashlib.sha1(serializer.dumps(p, sort_keys=True)).hexdigest()
+
+def json_with_etag(p: dict, status: int = 200):
+    resp = jsonify(with_brand_and_photo(p))
+    resp.status_code = status
+    resp.set_etag(record_etag(p))
+    return resp
+
+def with_brand_and_photo(p) -> dict:
+    """Запись для ответа API: поля хранения + brandLabel, photoUrl, thumbUrl."""
+    if isinstance(p, ProductRecord):
+        return {**p.to_dict(), "brandLabel": p.brand_label, "photoUrl": p.photo_url, "thumbUrl": p.thumb_url}
     brand = one_line(p.get("brand")).lower()
+    photo = photo_src(p.get("photo"))
     return {
         **p,
         "brandLabel": title_brand(brand) or brand.upper(),
-        "photoUrl": photo_src(p.get("photo")),
+        "photoUrl": photo,
+        "thumbUrl": thumb_src(photo),
+    }
+
+# ---------- Бренды: настройки и витрина по брендам ----------
+def brand_slug(p) -> str:
+    return p.brand_slug
+
+def brand_view(p) -> dict:
+    """Строка /api/products-by-brand — считается при записи товара, а не на каждый запрос."""
+    brand = p.brand_slug
+    type_str = one_line(p.get("type"))
+    return {
+        "id": p.get("id"),
+        "sku": one_line(p.get("sku")),
+        "brand": brand,
+        "brandLabel": p.brand_label if brand else "",
+        "model": one_line(p.get("model")),
+        "quality": one_line(p.get("quality")),
+        "price": parse_float(p.get("price"), 0),
+        "currency": one_line(p.get("currency") or "TJS"),
+        "vendor": one_line(p.get("vendor")),
+        "photo": one_line(p.get("photo")),
+        "photoUrl": p.photo_url,
+        "thumbUrl": p.thumb_url,
+        "type": type_str,
+        "tags": p.get("tags") or [],
+        "specs": specs_to_size(p.get("specs")),
+        "size": type_str,   # обратная совместимость
+        "stock": int(p.get("stock") or 0),
+        "active": bool(p.get("active", True)),
     }
 
+# кол-во товаров и сумма остатков по бренду; готовые строки витрины по бренду
+products_store.add_index("brand_stock", GroupSum(
+    lambda p: brand_slug(p) or None,
+    lambda p: int(p.get("stock") or 0),
+))
+products_store.add_index("brand_view", Projection(brand_view, brand_slug))
+
+BRAND_DEFAULT_COLOR = "#1D4ED8"
+BRAND_FIELDS = ("name", "order", "color", "active")
+
+brands_store = RecordStore(make_storage(BRANDS_FILE))   # id записи = slug бренда
+
+# лента изменений (SSE /api/events): товар — в том же виде, что в списке /api/products
+watch(products_store, "products", with_brand_and_photo)
+watch(brands_store, "brands")
+
+def brand_settings(data: dict) -> tuple:
+    """Проверка полей PUT /api/brands/<slug>: (изменения, ошибка)."""
+    out = {}
+    if "name" in data:
+        out["name"] = one_line(data.get("name"))
+    if "order" in data:
+        if data.get("order") in (None, ""):
+            out["order"] = None
+        else:
+            order = strict_int(data.get("order"))
+            if order is None:
+                return None, "order must be integer"
+            out["order"] = order
+    if "color" in data:
+        color = one_line(data.get("color"))
+        if color and not re.fullmatch(r"#[0-9A-Fa-f]{6}", color):
+            return None, "color must be #RRGGBB"
+        out["color"] = color or None
+    if "active" in data:
+        out["active"] = parse_bool(data.get("active"))
+    return out, None
+
+def brand_catalog() -> list:
+    """
+    Бренды, у которых есть товары, и бренды с сохранёнными настройками.
+    Сортировка — по order из настроек (без order — в конце), затем по slug.
+    """
+    with products_store.reading():
+        groups = {k: tuple(v) for k, v in products_store.index("brand_stock").items()}
+    with brands_store.reading():
+        settings = {s["id"]: s for s in brands_store.values()}
+
+    def sort_key(slug):
+        order = settings.get(slug, {}).get("order")
+        return (order is None, order if order is not None else 0, slug)
+
+    out = []
+    for i, slug in enumerate(sorted(groups.keys() | settings.keys(), key=sort_key)):
+        s = settings.get(slug, {})
+        count, stock = groups.get(slug, (0, 0))
+        out.append({
+            "id": slug,
+            "slug": slug,
+            "name": s.get("name") or title_brand(slug) or slug.upper(),
+            "active": bool(s.get("active", True)),
+            "order": s["order"] if s.get("order") is not None else i + 1,
+            "color": s.get("color") or BRAND_DEFAULT_COLOR,
+            "count": count,
+            "stock": int(stock),
+        })
+    return out
+
+# ---------- Потоковый импорт ----------
+IMPORT_BATCH = 2000
+IMPORT_BATCH_MAX = 50000
+IMPORT_MAX_ERRORS = 100     # в отчёт попадают первые N ошибок, счётчик — полный
+
+def import_product_rows(rows, batch_size: int = IMPORT_BATCH, on_progress=None) -> dict:
+    """
+    Upsert потока строк пачками: пачка нормализуется, затем одна транзакция
+    (одна запись в хранилище) на пачку; дубликаты ищутся по хеш-индексу SKU.
+    on_progress(report) вызывается после каждой пачки.
+    """
+    report = {"ok": True, "created": 0, "merged": 0, "rows": 0, "errors": [], "error_count": 0}
+
+    def fail(rowno, error):
+        report["error_count"] += 1
+        if len(report["errors"]) < IMPORT_MAX_ERRORS:
+            report["errors"].append({"row": rowno, "error": error})
+
+    rowno = 0
+    try:
+        for batch in batched(rows, batch_size):
+            items = []
+            for row in batch:
+                rowno += 1
+                if isinstance(row, BadRow):
+                    fail(rowno, row.error)
+                    continue
+                if not isinstance(row, dict):
+                    fail(rowno, "expect object")
+                    continue
+                item = normalized_item(row, keep_id=False)
+                if not one_line(item.get("sku")):
+                    fail(rowno, "empty sku")
+                    continue
+                items.append(item)
+
+            with products_store.transaction():
+                for item in items:
+                    _, is_new = upsert_product(item)
+                    report["created" if is_new else "merged"] += 1
+            report["rows"] = rowno
+            if on_progress:
+                on_progress(report)
+    except ImportFormatError as e:
+        # уже записанные пачки остаются — в отчёте видно, сколько строк прошло
+        report["ok"] = False
+        report["error"] = str(e)
+
+    report["rows"] = rowno
+    report["total"] = len(products_store)
+    return report
+
+def run_import_job(job, path, fmt: str, batch_size: int, encoding: str = DEFAULT_ENCODING):
+    """Импорт из сохранённого файла в фоне; прогресс — строки и прочитанные байты."""
+    size = path.stat().st_size
+    try:
+        with open(path, "rb") as f:
+            def on_progress(r):
+                job.progress(rows=r["rows"], created=r["created"], merged=r["merged"],
+                             error_count=r["error_count"], bytes=min(f.tell(), size), bytes_total=size)
+            return import_product_rows(iter_rows(f, fmt, encoding), batch_size, on_progress=on_progress)
+    finally:
+        path.unlink(missing_ok=True)
+
+def run_export_job(job, fmt: str = "json", args=None):
+    rows = export_products_rows(args or {})
+    out = job.path(f".export.{fmt}")
+    mode, enc = ("wb", None) if fmt == "xlsx" else ("w", "utf-8")
+    with open(out, mode, encoding=enc) as f:
+        for chunk in stream_export(fmt, rows, PRODUCT_EXPORT_COLUMNS, "Products"):
+            f.write(chunk)
+    job.set_artifact(out, f"products_export.{fmt}", MIMETYPES[fmt])
+    return {"count": len(rows)}
+
+def job_accepted(job):
+    return jsonify({"ok": True, "job": job.id, "status_url": f"/api/jobs/{job.id}"}), 202
+
+# ---------- Пакетное изменение остатков ----------
+def strict_int(v):
+    """Целое из числа/строки; None, если это не целое (в отличие от parse_int — без молчаливых нулей)."""
+    if isinstance(v, bool) or v is None:
+        return None
+    try:
+        f = float(str(v).replace(",", ".").strip())
+    except ValueError:
+        return None
+    return int(f) if math.isfinite(f) and f == int(f) else None
+
+def apply_stock_batch(rows) -> tuple:
+    """
+    rows: [{id, stock}] — абсолютное значение или [{id, delta}] — приращение.
+    Всё или ничего: сначала проверяем все строки по индексу id, потом одна транзакция.
+    Возвращает (ok, results).
+    """
+    results, changes = [], []
+    with products_store.transaction():
+        pending = {}   # id -> остаток с учётом предыдущих строк этой же пачки
+        for n, row in enumerate(rows):
+            res = {"row": n, "id": row.get("id") if isinstance(row, dict) else None}
+            results.append(res)
+            if not isinstance(row, dict):
+                res["error"] = "expect object"
+                continue
+            id_ = one_line(row.get("id"))
+            p = products_store.peek(id_) if id_ else None
+            if p is None:
+                res["error"] = "not found"
+                continue
+            has_stock, has_delta = row.get("stock") is not None, row.get("delta") is not None
+            if has_stock == has_delta:
+                res["error"] = "expect stock or delta"
+                continue
+            value = strict_int(row.get("stock") if has_stock else row.get("delta"))
+            if value is None:
+                res["error"] = "not an integer"
+                continue
+            prev = pending.get(id_, int(p.get("stock") or 0))
+            new = value if has_stock else prev + value
+            if new < 0:
+                res["error"] = "stock below zero"
+                continue
+            pending[id_] = new
+            res.update(prev=prev, stock=new)
+            changes.append((id_, new))
+
+        if any("error" in r for r in results):
+            return False, results
+        for id_, new in changes:
+            products_store.put({**products_store.peek(id_), "stock": new})
+    return True, results
+
+# ---------- Сканер ----------
+def apply_scan_batch(rows, default_delta: int = -1) -> tuple:
+    """
+    Пачка сканов: ["код", ...] или [{code, delta?}]; delta по умолчанию default_delta
+    (-1 — выдача со склада, +1 — приёмка). Коды разрешаются и остатки меняются в одной
+    транзакции (дальше — apply_stock_batch), так что пачки с разных терминалов
+    не затирают друг друга. Всё или ничего. Возвращает (ok, results).
+    """
+    results, scans = [], []
+    with products_store.transaction():
+        for n, row in enumerate(rows):
+            if isinstance(row, str):
+                row = {"code": row}
+            res = {"row": n}
+            results.append(res)
+            if not isinstance(row, dict):
+                res["error"] = "expect object"
+                continue
+            res["code"] = one_line(row.get("code"))
+            p, match = find_by_code(res["code"])
+            if p is None:
+                res["error"] = "not found"
+                continue
+            res.update(id=p["id"], sku=p.get("sku"), match=match)
+            delta = default_delta if row.get("delta") is None else row.get("delta")
+            scans.append((res, {"id": p["id"], "delta": delta}))
+
+        if any("error" in r for r in results):
+            return False, results
+        ok, stock_results = apply_stock_batch([row for _, row in scans])
+        for (res, _), sr in zip(scans, stock_results):
+            res.update({k: sr[k] for k in ("prev", "stock", "error") if k in sr})
+    return ok, results
+
+# ---------- Пакетные операции с товарами ----------
+BULK_OPS = ("upsert", "update", "delete")
+
+def apply_bulk(rows: list) -> dict:
+    """
+    Пакет [{op?, ...}] одной транзакцией (одна запись в хранилище):
+      upsert (по умолчанию) — как POST /api/products, update — как PUT (нужен id), delete — по id.
+    Upsert-строки нормализуются одним проходом и группируются по SKU: дубликаты внутри
+    пачки сначала сливаются между собой, в каталог идёт одно слияние на SKU.
+    """
+    results = [{"index": n} for n in range(len(rows))]
+    counts = {"added": 0, "merged": 0, "updated": 0, "deleted": 0, "errors": 0}
+
+    def fail(n, error):
+        results[n].update(status="error", error=error)
+        counts["errors"] += 1
+
+    # 1) разбор и нормализация; группы upsert по SKU
+    groups = {}    # sku_key -> {"item": слитая запись, "rows": [индексы]}
+    plan = []      # (n, op, данные) в исходном порядке
+    for n, row in enumerate(rows):
+        if not isinstance(row, dict):
+            fail(n, "expect object")
+            continue
+        op = one_line(row.get("op")).lower() or "upsert"
+        if op not in BULK_OPS:
+            fail(n, "unknown op")
+            continue
+        data = {k: v for k, v in row.items() if k != "op"}
+        if op != "upsert":
+            if not one_line(data.get("id")):
+                fail(n, "id required")
+                continue
+            plan.append((n, op, data))
+            continue
+        item = normalized_item(data, keep_id=False)
+        key = sku_key(item.get("sku"))
+        if not key:
+            fail(n, "empty sku")
+            continue
+        g = groups.get(key)
+        if g is None:
+            groups[key] = {"item": item, "rows": [n]}
+            plan.append((n, "upsert", key))
+        else:
+            merge_product(g["item"], item)
+            g["rows"].append(n)
+
+    # 2) применение в исходном порядке
+    with products_store.transaction():
+        for n, op, data in plan:
+            if op == "upsert":
+                g = groups[data]
+                rec, created = upsert_product(g["item"])
+                for k, m in enumerate(g["rows"]):
+                    status = "created" if (created and k == 0) else "merged"
+                    results[m].update(status=status, id=rec["id"], sku=rec.get("sku"))
+                    counts["added" if status == "created" else "merged"] += 1
+                continue
+
+            p = products_store.peek(one_line(data.get("id")))
+            if p is None:
+                fail(n, "not found")
+            elif op == "delete":
+                products_store.delete(p["id"])
+                results[n].update(status="deleted", id=p["id"])
+                counts["deleted"] += 1
+            else:
+                rec, status = update_product(p, data)
+                results[n].update(status=status, id=rec["id"])
+                counts["updated" if status == "updated" else "merged"] += 1
+        total = len(products_store)
+
+    return {"ok": True, **counts, "total": total, "results": results}
+
+# ---------- Выборка каталога: фильтры, сортировка, страницы ----------
+PAGE_LIMIT_DEFAULT = 50
+PAGE_LIMIT_MAX = 1000
+PRODUCT_SORTS = ("created", "price", "stock", "model")
+# тип ключа упорядоченного индекса по полю сортировки: курсор другой сортировки не сравнивается с ним
+_SORT_KEY_TYPES = {"created": (int,), "price": (int, float), "stock": (int, float), "model": (str,)}
+
+def product_sort(args):
+    """(поле сортировки, по убыванию ли) из sort=<поле>_<asc|desc>."""
+    sort_field, _, direction = (args.get("sort") or "created_asc").partition("_")
+    if sort_field not in PRODUCT_SORTS:
+        sort_field = "created"
+    return sort_field, direction == "desc"
+
+def encode_cursor(entry) -> str:
+    raw = json.dumps(list(entry), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(s: str, sort_field: str = "created"):
+    """(ключ, id) или None — курсор битый или выдан для другой сортировки."""
+    try:
+        raw = base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+        key, id_ = json.loads(raw)
+    except Exception:
+        return None
+    if type(key) is bool or not isinstance(key, _SORT_KEY_TYPES[sort_field]):
+        return None
+    return (key, str(id_))
+
+def _range_arg(args, name):
+    v = args.get(name)
+    return None if v in (None, "") else parse_float(v, 0)
+
+def select_products(args):
+    """
+    Фильтры: brand, quality, active, q (поиск по индексу, см. search_ids), stock_min/stock_max, price_min/price_max.
+    Сортировка: sort=<created|price|stock|model>_<asc|desc> (по умолчанию — по created_seq, порядок создания).
+    Возвращает (entries, desc): отсортированный по возрастанию список (ключ, id) и направление.
+    Вызывать внутри products_store.reading().
+
+    Самый избирательный фильтр берётся из индекса, остальные проверяются только
+    на его кандидатах; без фильтров отдаётся сам упорядоченный индекс (без копирования).
+    """
+    store = products_store
+    drivers = []   # (оценка размера, итератор id)
+    preds = []     # проверки для остальных фильтров
+
+    for field in ("brand", "quality"):
+        val = one_line(args.get(field)).lower()
+        if val:
+            bucket = store.index(field).bucket(val)
+            drivers.append((len(bucket), lambda b=bucket: iter(b)))
+            preds.append(lambda p, f=field, v=val: one_line(p.get(f)).lower() == v)
+
+    for field in ("price", "stock"):
+        lo, hi = _range_arg(args, f"{field}_min"), _range_arg(args, f"{field}_max")
+        if lo is not None or hi is not None:
+            idx = store.index(field)
+            start, stop = idx.span(lo, hi)
+            drivers.append((stop - start, lambda i=idx, a=lo, b=hi: i.ids(a, b)))
+            preds.append(lambda p, f=field, a=lo, b=hi:
+                         (a is None or _num_key(p.get(f)) >= a) and (b is None or _num_key(p.get(f)) <= b))
+
+    if args.get("active") not in (None, ""):
+        want = parse_bool(args.get("active"))
+        preds.append(lambda p, w=want: bool(p.get("active", True)) == w)
+
+    q = one_line(args.get("q"))
+    if q:
+        hits = search_ids(q)
+        hit_set = set(hits)
+        drivers.append((len(hits), lambda h=hits: iter(h)))
+        preds.append(lambda p, h=hit_set: p["id"] in h)
+
+    sort_field, desc = product_sort(args)
+    order_idx = store.index(sort_field)
+
+    if preds:
+        if drivers:
+            _, ids = min(drivers, key=lambda d: d[0])
+            candidates = (store.peek(i) for i in ids())
+        else:
+            candidates = iter(store.values())
+        matched = [p for p in candidates if all(f(p) for f in preds)]
+        return sorted((order_idx.key_fn(p), p["id"]) for p in matched), desc
+    return order_idx.entries, desc
+
+def query_products(args, paged: bool = True) -> dict:
+    """
+    Выборка для GET /api/products (фильтры и сортировка — см. select_products).
+    Страницы: limit + offset или limit + cursor (next_cursor из прошлого ответа);
+    paged=False — все подходящие записи.
+    """
+    store = products_store
+    with store.reading():
+        entries, desc = select_products(args)
+        n = total = len(entries)
+        if paged:
+            limit = min(max(parse_int(args.get("limit"), PAGE_LIMIT_DEFAULT), 1), PAGE_LIMIT_MAX)
+            cursor = decode_cursor(args.get("cursor") or "", product_sort(args)[0])
+        else:
+            limit, cursor = max(n, 1), None
+        if cursor is not None:
+            start = bisect_left(entries, cursor) - 1 if desc else bisect_right(entries, cursor)
+        else:
+            offset = max(parse_int(args.get("offset"), 0), 0)
+            start = n - 1 - offset if desc else offset
+
+        if desc:
+            page = [entries[i] for i in range(start, max(start - limit, -1), -1)] if start >= 0 else []
+            more = start - limit >= 0
+        else:
+            page = entries[start:start + limit]
+            more = start + limit < n
+
+        items = [with_brand_and_photo(store.peek(i)) for _, i in page]
+
+    return {
+        "ok": True,
+        "items": items,
+        "total": total,
+        "limit": limit,
+        "next_cursor": encode_cursor(page[-1]) if (more and page) else None,
+    }
+
+# ---------- Выгрузка ----------
+PRODUCT_EXPORT_COLUMNS = [
+    (name, lambda p, k=name: p.get(k))
+    for name in ("id", "sku", "barcodes", "brand", "model", "quality", "price", "currency",
+                 "vendor", "photo", "stock", "type", "tags", "specs", "active")
+]
+
+def export_products_rows(args) -> list:
+    """
+    Записи для выгрузки с теми же фильтрами и сортировкой, что GET /api/products (без страниц).
+    Список ссылок на записи хранилища (copy-on-write — снимок не меняется), сериализует их
+    уже генератор выгрузки по одной.
+    """
+    store = products_store
+    with store.reading():
+        entries, desc = select_products(args)
+        ids = reversed(entries) if desc else entries
+        return [p for p in (store.peek(i) for _, i in ids) if p is not None]
+
+def export_format(args) -> str:
+    fmt = one_line(args.get("format")).lower() or "json"
+    return fmt if fmt in EXPORT_FORMATS else ""
+
 # ---------- Регистрация маршрутов ----------
 def register_products_routes(app):
     # ====== Прямые маршруты для изображений из public/images ======
@@ -209,10 +946,8 @@ def register_products_routes(app):
 
     @app.route("/images/<path:filename>")
     def _serve_images(filename):
-        try:
-            return send_from_directory(IMAGES_DIR, filename)
-        except Exception:
-            abort(404)
+        # ?w=<ширина> — уменьшенная копия (WebP, если браузер умеет), см. logic/images.py
+        return serve_image(filename)
 
     # Временный диагностический эндпоинт (можно удалить после проверки)
     @app.get("/__ls_images")
@@ -225,10 +960,25 @@ def register_products_routes(app):
     # ====== CRUD ======
     @app.get("/api/products")
     def api_products_all():
-        items = load_products()
-        # возвращаем вместе с brandLabel и photoUrl
-        out = [with_brand_and_photo(p) for p in items]
-        return jsonify(out)
+        """
+        Без параметров — весь каталог массивом (как раньше).
+        С фильтрами/сортировкой/страницами (см. query_products) — {"items", "total", "next_cursor"};
+        если задан только фильтр без limit/offset/cursor — отфильтрованный массив целиком.
+        Ответ кэшируется по версии каталога (ETag/304, см. logic/http_cache.py).
+        """
+        args = request.args
+        if args.get("cursor") and decode_cursor(args["cursor"], product_sort(args)[0]) is None:
+            return jsonify({"error": "bad cursor"}), 400
+
+        def build():
+            if not args:
+                # возвращаем вместе с brandLabel и photoUrl
+                return jsonify([with_brand_and_photo(p) for p in products_store.all()])
+            if any(k in args for k in ("limit", "offset", "cursor")):
+                return jsonify(query_products(args))
+            return jsonify(query_products(args, paged=False)["items"])
+
+        return cached_json("products", products_store, build)
 
     @app.post("/api/products")
     def api_products_create():
@@ -239,156 +989,204 @@ def register_products_routes(app):
         """
         data = get_payload()
         item = normalized_item(data, keep_id=False)
-        items = load_products()
 
         if not one_line(item.get("sku")):
             item["sku"] = make_sku(item.get("brand"), item.get("model"), item.get("quality"))
 
-        exist = find_by_sku(items, item["sku"])
-        if exist:
-            merge_product(exist, item)
-            save_products(items)
-            return jsonify(with_brand_and_photo(exist)), 200
+        with products_store.transaction():
+            rec, created = upsert_product(item)
+        return jsonify(with_brand_and_photo(rec)), (201 if created else 200)
 
-        items.append(item)
-        save_products(items)
-        return jsonify(with_brand_and_photo(item)), 201
+    @app.get("/api/products/<id>")
+    def api_products_one(id):
+        p = products_store.get(id)
+        if p is None:
+            return jsonify({"error": "not found"}), 404
+        return json_with_etag(p)
 
     @app.put("/api/products/<id>")
     def api_products_update(id):
+        """
+        Обновление по id. С заголовком If-Match (ETag из GET/PUT) — оптимистичная
+        проверка: если товар успели изменить в другой вкладке/воркере, вернём 412 и актуальную версию.
+        """
         data = get_payload()
-        items = load_products()
-
-        # найдём по id
-        for p in items:
-            if p.get("id") == id:
-                updated = normalized_item({**p, **data}, keep_id=True)
-
-                # если поменяли SKU и такой SKU уже есть у другого товара — объединим в того
-                if one_line(updated.get("sku")) and one_line(updated.get("sku")).lower() != one_line(p.get("sku")).lower():
-                    dup = find_by_sku(items, updated["sku"])
-                    if dup and dup.get("id") != id:
-                        # переносим stock/поля и удаляем исходный
-                        merge_product(dup, updated)
-                        items = [x for x in items if x.get("id") != id]
-                        save_products(items)
-                        return jsonify(with_brand_and_photo(dup)), 200
-
-                # обычное обновление
-                p.update(updated)
-                save_products(items)
-                return jsonify(with_brand_and_photo(p)), 200
-
-        return jsonify({"error": "not found"}), 404
+
+        with products_store.transaction():
+            p = products_store.get(id)
+            if p is None:
+                return jsonify({"error": "not found"}), 404
+            # contains_weak: сжатый ответ GET отдаёт тот же тег как W/"..." (см. logic/serializer.py)
+            if request.if_match and not request.if_match.contains_weak(record_etag(p)):
+                return json_with_etag(p, 412)
+
+            rec, _ = update_product(p, data)
+            return json_with_etag(rec)
 
     @app.delete("/api/products/<id>")
     def api_products_delete(id):
-        items = load_products()
-        new_items = [p for p in items if p.get("id") != id]
-        if len(new_items) == len(items):
-            return jsonify({"error": "not found"}), 404
-        save_products(new_items)
+        with products_store.transaction():
+            if not products_store.delete(id):
+                return jsonify({"error": "not found"}), 404
         return jsonify({"ok": True})
 
-    # ====== Импорт/Экспорт ======
-    @app.post("/api/products/import")
-    def api_products_import():
+    @app.post("/api/products/bulk")
+    def api_products_bulk():
         """
-        Принимает массив товаров. Нормализует и объединяет по SKU (upsert).
+        Пакетное создание/обновление/удаление (см. apply_bulk): массив или {"items": [...]}.
+        Ответ: added/merged/updated/deleted/errors, total и статус по каждой строке.
         """
         payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get("items")
         if not isinstance(payload, list):
             return jsonify({"error": "expect array"}), 400
+        return jsonify(apply_bulk(payload))
 
-        items = load_products()
-        merged = 0
-        created = 0
+    @app.put("/api/stock-batch")
+    def api_stock_batch():
+        """
+        Пакетное обновление остатков со склада: [{id, stock}] или [{id, delta}]
+        (можно {"items": [...]}). Одна проверка и одна запись на всю пачку;
+        при любой ошибке не меняется ничего — в results видно, какие строки плохие.
+        """
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get("items")
+        if not isinstance(payload, list):
+            return jsonify({"ok": False, "error": "expect array"}), 400
 
-        for row in payload:
-            item = normalized_item(row, keep_id=False)
-            if not one_line(item.get("sku")):
-                item["sku"] = make_sku(item.get("brand"), item.get("model"), item.get("quality"))
+        ok, results = apply_stock_batch(payload)
+        if not ok:
+            return jsonify({"ok": False, "error": "validation failed", "results": results}), 400
+        return jsonify({"ok": True, "updated": len(results), "results": results})
 
-            exist = find_by_sku(items, item["sku"])
-            if exist:
-                merge_product(exist, item)
-                merged += 1
-            else:
-                items.append(item)
-                created += 1
+    # ====== Сканер ======
+    @app.get("/api/scan/<path:code>")
+    def api_scan(code):
+        """Товар по отсканированному коду: точный SKU или один из штрихкодов (barcodes)."""
+        with products_store.reading():
+            p, match = find_by_code(code)
+        if p is None:
+            return jsonify({"error": "not found"}), 404
+        return jsonify({"ok": True, "match": match, "item": with_brand_and_photo(p)})
+
+    @app.post("/api/scan-batch")
+    def api_scan_batch():
+        """
+        Пачка сканов с терминала: ["код", ...], [{code, delta}] или {"items": [...], "delta": -1|1}.
+        Одна транзакция и одна запись на всю пачку; при ошибке не меняется ничего.
+        """
+        payload = request.get_json(silent=True)
+        default_delta = -1
+        if isinstance(payload, dict):
+            if payload.get("delta") is not None:
+                default_delta = strict_int(payload.get("delta"))
+                if default_delta is None:
+                    return jsonify({"ok": False, "error": "not an integer"}), 400
+            payload = payload.get("items")
+        if not isinstance(payload, list):
+            return jsonify({"ok": False, "error": "expect array"}), 400
+
+        ok, results = apply_scan_batch(payload, default_delta)
+        if not ok:
+            return jsonify({"ok": False, "error": "validation failed", "results": results}), 400
+        return jsonify({"ok": True, "updated": len(results), "results": results})
+
+    # ====== Импорт/Экспорт ======
+    @app.post("/api/products/import")
+    def api_products_import():
+        """
+        Принимает массив товаров. Нормализует и объединяет по SKU (upsert).
+        Тело читается потоком: JSON-массив, NDJSON или CSV (по ?format=, Content-Type
+        или имени файла в multipart-поле file); ?batch= — размер пачки, ?encoding= — кодировка
+        файла (по умолчанию UTF-8; CSV из Excel под Windows — cp1251).
+        Ответ: created/merged/total как раньше + rows, errors (первые 100), error_count.
+        С ?async=1 тело сохраняется в data/jobs/, импорт идёт в фоне: 202 + id задачи
+        (статус и прогресс — GET /api/jobs/<id>).
+        """
+        upload = request.files.get("file")
+        if upload is not None:
+            stream = upload.stream
+            fmt = detect_format(upload.mimetype, upload.filename, request.args.get("format"))
+        else:
+            stream = request.stream
+            fmt = detect_format(request.content_type, "", request.args.get("format"))
+
+        batch = min(max(parse_int(request.args.get("batch"), IMPORT_BATCH), 1), IMPORT_BATCH_MAX)
+        encoding = one_line(request.args.get("encoding")) or DEFAULT_ENCODING
+        if not valid_encoding(encoding):
+            return jsonify({"error": "unknown encoding"}), 400
+        if parse_bool(request.args.get("async"), False):
+            job = new_job("products-import")
+            upload = job.path(f".upload.{fmt}")
+            with open(upload, "wb") as f:
+                shutil.copyfileobj(stream, f, 1024 * 1024)
+            return job_accepted(submit(job, run_import_job, upload, fmt, batch, encoding))
 
-        save_products(items)
-        return jsonify({"ok": True, "created": created, "merged": merged, "total": len(items)}), 200
+        report = import_product_rows(iter_rows(stream, fmt, encoding), batch_size=batch)
+        if not report["ok"] and report["rows"] == 0:
+            return jsonify({"error": report["error"]}), 400
+        return jsonify(report), 200
 
     @app.get("/api/products/export")
     def api_products_export():
-        items = load_products()
-        return Response(
-            json.dumps(items, ensure_ascii=False, indent=2),
-            mimetype="application/json; charset=utf-8"
+        # ?format=json|csv|ndjson|xlsx, фильтры и sort — как у GET /api/products
+        # ?async=1 — файл готовится в фоне, скачивание по artifact_url из /api/jobs/<id>
+        fmt = export_format(request.args)
+        if not fmt:
+            return jsonify({"error": "unknown format"}), 400
+        args = request.args.to_dict()
+        if parse_bool(args.pop("async", None), False):
+            return job_accepted(submit(new_job("products-export"), run_export_job, fmt, args))
+        rows = export_products_rows(args)
+        resp = Response(
+            stream_with_context(stream_export(fmt, rows, PRODUCT_EXPORT_COLUMNS, "Products")),
+            mimetype=MIMETYPES[fmt]
         )
+        resp.headers["Content-Disposition"] = f'attachment; filename="products_export.{fmt}"'
+        return resp
 
     # ====== Справочники/выдача ======
     @app.get("/api/brands")
     def api_brands():
-        items = load_products()
-        slugs = sorted({(one_line(p.get("brand")) or "").lower()
-                        for p in items if one_line(p.get("brand"))})
-        out = [{
-            "id": s,
-            "slug": s,
-            "name": title_brand(s) or s.upper(),
-            "active": True,
-            "order": i + 1,
-            "color": "#1D4ED8"
-        } for i, s in enumerate(slugs)]
-        return jsonify({"ok": True, "items": out})
+        return cached_json("brands", (products_store, brands_store),
+                           lambda: jsonify({"ok": True, "items": brand_catalog()}))
+
+    @app.put("/api/brands/<slug>")
+    def api_brands_update(slug):
+        slug = one_line(slug).lower()
+        data = get_payload()
+        if not isinstance(data, dict):
+            return jsonify({"error": "expect object"}), 400
+        changes, err = brand_settings(data)
+        if err:
+            return jsonify({"error": err}), 400
+        with brands_store.transaction():
+            rec = dict(brands_store.peek(slug) or {"id": slug})
+            rec.update(changes)
+            brands_store.put(rec)
+        item = next((b for b in brand_catalog() if b["slug"] == slug), None)
+        return jsonify({"ok": True, "item": item})
 
     @app.get("/api/products-by-brand")
     def api_products_by_brand():
+        return cached_json("products-by-brand", products_store, build_products_by_brand)
+
+    def build_products_by_brand():
         brand = one_line((request.args.get("brand") or "").lower())
         q = one_line((request.args.get("q") or "").lower())
-        items = load_products()
-        out = []
-
-        for p in items:
-            p_brand = one_line((p.get("brand") or "").lower())
-            if brand and p_brand != brand:
-                continue
-
+        store = products_store
+        with store.reading():
+            view = store.index("brand_view")
             if q:
-                hay = " ".join([
-                    one_line(p.get("sku")),
-                    one_line(p.get("model")),
-                    one_line(p.get("quality")),
-                    one_line(p.get("type")),
-                    one_line(p.get("specs")),
-                    " ".join([one_line(t) for t in (p.get("tags") or [])]),
-                ]).lower()
-                if q not in hay:
-                    continue
-
-            type_str  = one_line(p.get("type"))
-            specs_str = specs_to_size(p.get("specs"))
-
-            out.append({
-                "id": p.get("id"),
-                "sku": one_line(p.get("sku")),
-                "brand": p_brand,
-                "brandLabel": title_brand(p_brand),
-                "model": one_line(p.get("model")),
-                "quality": one_line(p.get("quality")),
-                "price": parse_float(p.get("price"), 0),
-                "currency": one_line(p.get("currency") or "TJS"),
-                "vendor": one_line(p.get("vendor")),
-                "photo": one_line(p.get("photo")),
-                "photoUrl": photo_src(p.get("photo")),
-                "type": type_str,
-                "tags": p.get("tags") or [],
-                "specs": specs_str,
-                "size": type_str,   # обратная совместимость
-                "stock": int(p.get("stock") or 0),
-                "active": bool(p.get("active", True)),
-            })
-
+                # поиск — по инвертированному индексу, в порядке релевантности
+                rows = (view.get(i) for i in search_ids(q))
+                out = [r for r in rows if r is not None and (not brand or r["brand"] == brand)]
+            elif brand:
+                # готовые строки группы бренда, в порядке хранения
+                group = view.group(brand)
+                out = [group[i] for i in sorted(group, key=store.seq)]
+            else:
+                out = [view.get(i) for i in (p["id"] for p in store.values())]
         return jsonify({"ok": True, "items": out})
@@ -0,0 +1,117 @@
+# logic/search.py
+from bisect import bisect_left, insort
+import re
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text) -> list:
+    return _TOKEN_RE.findall(f"{text or ''}".lower())
+
+
+def trigrams(token: str) -> set:
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс для поиска по товарам; подключается к RecordStore как обычный индекс
+    (rebuild/add/discard), поэтому обновляется при создании, правке, импорте и удалении.
+
+    - токен -> {id: вес}, вес зависит от поля (sku/модель важнее характеристик);
+    - отсортированный словарь токенов — поиск по префиксу через bisect;
+    - триграммы токенов — поиск подстроки внутри слова («phone» найдёт iphone),
+      с меньшим весом, чем точное слово или префикс.
+    Запрос из нескольких слов — AND, результат отсортирован по сумме весов.
+    """
+    def __init__(self, fields: dict):
+        self.fields = fields          # имя -> (функция значения, вес)
+        self.postings = {}            # токен -> {id: вес}
+        self.vocab = []               # отсортированные токены
+        self.grams = {}               # триграмма -> {токены}
+
+    def _doc(self, rec) -> dict:
+        weights = {}
+        for get, w in self.fields.values():
+            for tok in tokenize(get(rec)):
+                weights[tok] = max(weights.get(tok, 0), w)
+        return weights
+
+    def rebuild(self, recs):
+        self.postings, self.grams = {}, {}
+        for rec in recs:
+            for tok, w in self._doc(rec).items():
+                self.postings.setdefault(tok, {})[rec["id"]] = w
+        self.vocab = sorted(self.postings)
+        for tok in self.vocab:
+            for g in trigrams(tok):
+                self.grams.setdefault(g, set()).add(tok)
+
+    def add(self, rec):
+        for tok, w in self._doc(rec).items():
+            bucket = self.postings.get(tok)
+            if bucket is None:
+                bucket = self.postings[tok] = {}
+                insort(self.vocab, tok)
+                for g in trigrams(tok):
+                    self.grams.setdefault(g, set()).add(tok)
+            bucket[rec["id"]] = w
+
+    def discard(self, rec):
+        for tok in self._doc(rec):
+            bucket = self.postings.get(tok)
+            if bucket is None:
+                continue
+            bucket.pop(rec["id"], None)
+            if not bucket:
+                del self.postings[tok]
+                i = bisect_left(self.vocab, tok)
+                if i < len(self.vocab) and self.vocab[i] == tok:
+                    del self.vocab[i]
+                for g in trigrams(tok):
+                    toks = self.grams.get(g)
+                    if toks is not None:
+                        toks.discard(tok)
+                        if not toks:
+                            del self.grams[g]
+
+    def _tokens_for(self, term: str) -> dict:
+        """Токены словаря, подходящие под слово запроса -> множитель веса."""
+        out = {}
+        # префикс: подряд идущий диапазон отсортированного словаря
+        i = bisect_left(self.vocab, term)
+        while i < len(self.vocab) and self.vocab[i].startswith(term):
+            out[self.vocab[i]] = 2.0 if self.vocab[i] == term else 1.0
+            i += 1
+        if len(term) < 3:
+            return out
+        # подстрока внутри слова: пересечение множеств токенов по триграммам запроса
+        cands = None
+        for g in trigrams(term):
+            toks = self.grams.get(g)
+            if not toks:
+                return out
+            cands = set(toks) if cands is None else cands & toks
+        for tok in cands or ():
+            if tok not in out and term in tok:
+                out[tok] = 0.5
+        return out
+
+    def search(self, query: str) -> list:
+        """[(score, id), ...] по убыванию релевантности; пустой запрос — пустой список."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        scores = None
+        for term in terms:
+            hits = {}
+            for tok, bonus in self._tokens_for(term).items():
+                for id_, w in self.postings[tok].items():
+                    hits[id_] = max(hits.get(id_, 0), w * bonus)
+            if scores is None:
+                scores = hits
+            else:
+                scores = {i: s + hits[i] for i, s in scores.items() if i in hits}
+            if not scores:
+                return []
+        return sorted(((s, i) for i, s in scores.items()), key=lambda x: -x[0])
@@ -0,0 +1,147 @@
+# logic/serializer.py
+"""
+Сериализация JSON для хранилищ и ответов API.
+
+- orjson, если установлен (в разы быстрее на больших каталогах), иначе stdlib json;
+  что orjson не умеет (целые > 64 бит, ключи-не-строки) — молча через stdlib;
+- хранилища пишутся компактно, без отступов;
+- JSON-ответы Flask (jsonify) идут через тот же сериализатор (FastJSONProvider);
+- большие ответы сжимаются gzip/brotli по Accept-Encoding (brotli — если установлен).
+"""
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+import gzip, json, os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES") or 1024)
+COMPRESS_MIMETYPES = ("application/json", "application/x-ndjson", "text/csv")
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4      # дальше выигрыш в размере мал, а время растёт заметно
+
+
+def _stdlib_dumps(obj, sort_keys=False, indent=False, default=None) -> str:
+    default = default or to_json_default
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, indent=2, default=default)
+    return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":"), default=default)
+
+
+def to_json_default(o):
+    """Объекты с to_dict() (записи хранилищ, см. ProductRecord) сериализуются как dict."""
+    to_dict = getattr(o, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+    return to_dict()
+
+
+def dumps(obj, *, sort_keys=False, indent=False, default=to_json_default) -> bytes:
+    """Компактный UTF-8 JSON (indent=True — с отступом 2, для файлов «на глаз»)."""
+    if orjson is not None:
+        opts = (orjson.OPT_SORT_KEYS if sort_keys else 0) | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, default=default, option=opts)
+        except TypeError:
+            pass
+    return _stdlib_dumps(obj, sort_keys, indent, default).encode("utf-8")
+
+
+def dumps_str(obj, **kw) -> str:
+    if orjson is None:
+        return _stdlib_dumps(obj, kw.get("sort_keys", False), kw.get("indent", False), kw.get("default"))
+    return dumps(obj, **kw).decode("utf-8")
+
+
+def loads(data):
+    """bytes или str; BOM в начале файла допускается."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+        if data.startswith(b"\xef\xbb\xbf"):
+            data = data[3:]
+    elif data.startswith("\ufeff"):
+        data = data[1:]
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass   # NaN/Infinity и прочее, что пишет stdlib, — пусть решает он
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify/ app.json через dumps(): без лишней пересборки строки, тело сразу в байтах."""
+    def default(self, o):
+        if hasattr(o, "to_dict"):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps_str(obj, sort_keys=kwargs.get("sort_keys", False),
+                         indent=bool(kwargs.get("indent")), default=self.default)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(dumps(obj, indent=indent, default=self.default) + b"\n",
+                                        mimetype=self.mimetype)
+
+
+# ---------- Сжатие ответов ----------
+def negotiate_encoding():
+    """br или gzip — что клиент принимает (brotli — только если модуль установлен); None — без сжатия."""
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def should_compress(resp) -> bool:
+    return (
+        resp.status_code == 200
+        and not resp.direct_passthrough
+        and not resp.is_streamed
+        and "Content-Encoding" not in resp.headers
+        and resp.mimetype in COMPRESS_MIMETYPES
+        and (resp.content_length or 0) >= COMPRESS_MIN_BYTES
+    )
+
+
+def encode_response(resp, encoding: str):
+    """Подставить сжатое тело; сильный ETag становится слабым (тело уже другое по байтам)."""
+    resp.set_data(compress(resp.get_data(), encoding))
+    resp.headers["Content-Encoding"] = encoding
+    etag, weak = resp.get_etag()
+    if etag and not weak:
+        resp.set_etag(etag, weak=True)
+    return resp
+
+
+def init_compression(app):
+    @app.after_request
+    def _compress(resp):
+        resp.vary.add("Accept-Encoding")
+        if should_compress(resp):
+            encoding = negotiate_encoding()
+            if encoding:
+                encode_response(resp, encoding)
+        return resp
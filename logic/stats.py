@@ -0,0 +1,208 @@
+# logic/stats.py
+"""
+Статистика для /admin/stats: накопительные итоги поверх резидентных хранилищ.
+
+- склад: стоимость (цена × остаток), штуки и число позиций по бренду/качеству/валюте;
+- низкий остаток: активные товары с остатком <= порога (упорядоченный индекс stock);
+- закупки в Китае: сумма заказов по поставщику, дню и месяцу (в валюте заказа, без отменённых).
+
+Итоги — индексы хранилищ (GroupSum): при записи меняются только группы затронутых
+записей, поэтому ответ не зависит от размера каталога и истории заказов.
+Полный пересчёт (чтение с диска) — одним проходом с суммированием через numpy.bincount,
+если numpy установлен (необязательная зависимость), иначе обычным GroupSum.rebuild.
+"""
+from flask import request, jsonify
+import os
+
+from logic.store import GroupSum
+from logic.http_cache import cached_json
+from logic.products import products_store, one_line, title_brand, parse_bool, parse_float, parse_int, _num_key
+from logic.china_orders import china_store, order_status
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD") or 5)
+LOW_STOCK_LIMIT = 200
+CANCELLED = "Cancelled"
+
+
+class VectorGroupSum(GroupSum):
+    """GroupSum, у которого полный пересчёт суммирует группы через numpy (если есть)."""
+    def rebuild(self, recs):
+        if np is None:
+            return super().rebuild(recs)
+        codes, idx, vals = {}, [], []
+        for rec in recs:
+            key = self.key_fn(rec)
+            if key is None:
+                continue
+            idx.append(codes.setdefault(key, len(codes)))
+            vals.append(self.value_fn(rec))
+        if not codes:
+            self.groups = {}
+            return
+        counts = np.bincount(idx, minlength=len(codes))
+        sums = np.bincount(idx, weights=np.asarray(vals, dtype=float), minlength=len(codes))
+        self.groups = {k: [int(counts[i]), float(sums[i])] for k, i in codes.items()}
+
+
+# ---------- Склад ----------
+def inventory_key(p):
+    """(бренд, качество, валюта) — самая мелкая группа, остальные разрезы сворачиваются из неё."""
+    return (p.brand_slug, one_line(p.get("quality")), one_line(p.get("currency")) or "TJS")
+
+products_store.add_index("stats_value", VectorGroupSum(
+    inventory_key, lambda p: _num_key(p.get("price")) * _num_key(p.get("stock"))))
+products_store.add_index("stats_units", VectorGroupSum(
+    inventory_key, lambda p: _num_key(p.get("stock"))))
+
+INVENTORY_GROUPINGS = {
+    "brand": lambda k: (k[0], k[2]),
+    "quality": lambda k: (k[1], k[2]),
+    "currency": lambda k: (k[2], k[2]),
+}
+
+def inventory_rollup(by: str) -> list:
+    """Строки {key, label, currency, count, units, value} по разрезу by; вызывать внутри reading()."""
+    fold = INVENTORY_GROUPINGS[by]
+    units = products_store.index("stats_units").groups
+    out = {}
+    for key, (count, value) in products_store.index("stats_value").items():
+        g = out.setdefault(fold(key), [0, 0.0, 0.0])
+        g[0] += count
+        g[1] += units.get(key, (0, 0.0))[1]
+        g[2] += value
+    rows = []
+    for (key, currency), (count, u, value) in out.items():
+        label = (title_brand(key) or key.upper()) if by == "brand" else key
+        rows.append({"key": key, "label": label or "—", "currency": currency,
+                     "count": count, "units": round(u, 3), "value": round(value, 2)})
+    rows.sort(key=lambda r: (-r["value"], r["key"], r["currency"]))
+    return rows
+
+def low_stock(threshold: float, limit: int = LOW_STOCK_LIMIT):
+    """Активные товары с остатком <= threshold, по возрастанию остатка; (всего, первые limit)."""
+    total, items = 0, []
+    for pid in products_store.index("stock").ids(None, float(threshold)):
+        p = products_store.peek(pid)
+        if p is None or not parse_bool(p.get("active"), True):
+            continue
+        total += 1
+        if len(items) < limit:
+            items.append({"id": p["id"], "sku": p.get("sku"), "brand": p.brand_label,
+                          "model": p.get("model"), "quality": p.get("quality"),
+                          "stock": p.get("stock")})
+    return total, items
+
+
+# ---------- Закупки ----------
+def _spend_key(part):
+    def key(o):
+        if order_status(o) == CANCELLED:
+            return None
+        k = part(o)
+        return (k, one_line(o.get("currency")) or "TJS") if k else None
+    return key
+
+SPEND_GROUPINGS = {
+    "vendor": lambda o: one_line(o.get("vendor")) or "—",
+    "day": lambda o: one_line(o.get("date"))[:10] or None,
+    "month": lambda o: one_line(o.get("date"))[:7] or None,
+}
+for _by, _part in SPEND_GROUPINGS.items():
+    china_store.add_index(f"stats_spend_{_by}", VectorGroupSum(
+        _spend_key(_part), lambda o: parse_float(o.get("total"), 0)))
+
+def spend_rollup(by: str, date_from: str = "", date_to: str = "", currency: str = "") -> list:
+    """Строки {key, currency, orders, total}; вызывать внутри reading()."""
+    rows = []
+    for (key, cur), (count, total) in china_store.index(f"stats_spend_{by}").items():
+        if currency and cur != currency:
+            continue
+        if by != "vendor" and ((date_from and key < date_from[:len(key)]) or (date_to and key > date_to[:len(key)])):
+            continue
+        rows.append({"key": key, "currency": cur, "orders": count, "total": round(total, 2)})
+    if by == "vendor":
+        rows.sort(key=lambda r: (-r["total"], r["key"], r["currency"]))
+    else:
+        rows.sort(key=lambda r: (r["key"], r["currency"]))
+    return rows
+
+
+def stats_summary() -> dict:
+    """Плитки сверху страницы: склад по валютам, низкий остаток, закупки (без отменённых)."""
+    with products_store.reading():
+        value, units, count = {}, 0.0, 0
+        for r in inventory_rollup("currency"):
+            value[r["currency"]] = r["value"]
+            units += r["units"]
+            count += r["count"]
+        low_total, _ = low_stock(LOW_STOCK_THRESHOLD, 0)
+    with china_store.reading():
+        spend, orders = {}, 0
+        for (status, cur), (n, total) in china_store.index("totals").items():
+            if status == CANCELLED:
+                continue
+            orders += n
+            spend[cur] = spend.get(cur, 0.0) + total
+    return {
+        "ok": True,
+        "products": count,
+        "units": round(units, 3),
+        "inventory_value": value,
+        "low_stock": {"threshold": LOW_STOCK_THRESHOLD, "count": low_total},
+        "orders": orders,
+        "spend": {k: round(v, 2) for k, v in spend.items()},
+    }
+
+
+# ---------- Маршруты ----------
+def register_stats_routes(app):
+    @app.get("/api/stats/summary")
+    def api_stats_summary():
+        return cached_json("stats.summary", (products_store, china_store),
+                           lambda: jsonify(stats_summary()))
+
+    # ?by=brand|quality|currency
+    @app.get("/api/stats/inventory")
+    def api_stats_inventory():
+        by = request.args.get("by") or "brand"
+        if by not in INVENTORY_GROUPINGS:
+            return jsonify({"error": "unknown grouping"}), 400
+
+        def build():
+            with products_store.reading():
+                items = inventory_rollup(by)
+            return jsonify({"ok": True, "by": by, "items": items})
+        return cached_json("stats.inventory", products_store, build)
+
+    # ?threshold=5&limit=200
+    @app.get("/api/stats/low-stock")
+    def api_stats_low_stock():
+        threshold = parse_float(request.args.get("threshold"), LOW_STOCK_THRESHOLD)
+        limit = max(0, min(parse_int(request.args.get("limit"), LOW_STOCK_LIMIT), 1000))
+
+        def build():
+            with products_store.reading():
+                total, items = low_stock(threshold, limit)
+            return jsonify({"ok": True, "threshold": threshold, "total": total, "items": items})
+        return cached_json("stats.low_stock", products_store, build)
+
+    # ?by=vendor|day|month&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&currency=USD
+    @app.get("/api/stats/spend")
+    def api_stats_spend():
+        by = request.args.get("by") or "month"
+        if by not in SPEND_GROUPINGS:
+            return jsonify({"error": "unknown grouping"}), 400
+        date_from = one_line(request.args.get("date_from"))
+        date_to = one_line(request.args.get("date_to"))
+        currency = one_line(request.args.get("currency"))
+
+        def build():
+            with china_store.reading():
+                items = spend_rollup(by, date_from, date_to, currency)
+            return jsonify({"ok": True, "by": by, "items": items})
+        return cached_json("stats.spend", china_store, build)
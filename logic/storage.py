@@ -0,0 +1,416 @@
+# logic/storage.py
+from pathlib import Path
+import os, sqlite3, threading, weakref
+
+from logic import serializer
+
+try:
+    import fcntl
+except ImportError:  # Windows: остаются только блокировки внутри процесса
+    fcntl = None
+
+# ---------- Бэкенды хранения ----------
+# Выбор через переменную окружения STORAGE_BACKEND:
+#   json    — один JSON-файл, переписывается целиком (как было);
+#   journal — снимок JSON + журнал изменений (append-only), сворачивается по порогу;
+#   sqlite  — таблица на коллекцию в SQLITE_PATH (WAL), индексы по ключевым полям.
+# DATA_DIR — каталог данных (по умолчанию data/ в корне проекта; бенчмарки и тесты подменяют его)
+DATA_DIR = Path(os.getenv("DATA_DIR") or Path(__file__).resolve().parent.parent / "data")
+STORAGE_BACKEND = (os.getenv("STORAGE_BACKEND") or "json").strip().lower()
+JOURNAL_COMPACT_BYTES = int(os.getenv("JOURNAL_COMPACT_BYTES") or 4 * 1024 * 1024)
+SQLITE_PATH = os.getenv("SQLITE_PATH") or str(DATA_DIR / "admin.sqlite3")
+
+
+def ensure_data_dir():
+    """Каталог данных создаётся при старте приложения (create_app), а не при импорте модулей."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+
+_sqlite_storages = weakref.WeakSet()   # открывавшие соединение в этом процессе
+
+
+def close_connections():
+    """
+    Закрыть соединения SQLite текущего потока — в мастере gunicorn перед fork
+    (gunicorn.conf.py): соединение, перенесённое через fork, SQLite использовать запрещает.
+    """
+    for storage in list(_sqlite_storages):
+        storage.close()
+
+
+def _stat_stamp(fp: Path):
+    # st_ino обязателен: mtime на ext4 и др. тикает грубо, и две перезаписи одного размера
+    # в один тик дали бы одинаковый штамп; атомарная замена файла всегда даёт новый inode
+    try:
+        st = os.stat(fp)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _fsync_dir(dirpath: Path):
+    try:
+        fd = os.open(dirpath, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(fp: Path, text):
+    """Пишем во временный файл рядом, fsync и rename — читатель видит либо старое, либо новое (str или bytes)."""
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    tmp = fp.with_name(f".{fp.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(text.encode("utf-8") if isinstance(text, str) else text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, fp)
+    _fsync_dir(fp.parent)
+
+
+class FileLock:
+    """
+    Эксклюзивная advisory-блокировка (flock) на отдельном lock-файле: сериализует
+    чтение-изменение-запись между воркерами. Реентерабельна в пределах процесса;
+    между потоками не защищает — снаружи её держат под threading-локом хранилища.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd = None
+        self._depth = 0
+        self._pid = None
+
+    def acquire(self):
+        if self._depth and self._pid == os.getpid():
+            self._depth += 1
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        self._fd, self._depth, self._pid = fd, 1, os.getpid()
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def dump_items(items) -> bytes:
+    # компактно: отступы на большом каталоге — заметная доля и размера, и времени записи
+    items = list(items)
+    if items and hasattr(items[0], "to_json"):
+        # записи с готовым JSON (ProductRecord): склеиваем байты, без dict на каждую запись
+        return b"[" + b",".join([rec.to_json() for rec in items]) + b"]"
+    return serializer.dumps(items)
+
+
+class JsonFileStorage:
+    """Весь список записей в одном JSON-файле; запись — атомарной заменой файла."""
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.name = self.path.stem
+        self.lock = FileLock(self.path.with_name(f".{self.path.stem}.lock"))
+
+    def ensure(self):
+        if not self.path.exists():
+            atomic_write_text(self.path, "[]")
+
+    def load(self) -> list:
+        self.ensure()
+        with open(self.path, "rb") as f:
+            return serializer.loads(f.read())
+
+    def save(self, items):
+        atomic_write_text(self.path, dump_items(items))
+
+    def write(self, items, puts, deletes):
+        """Сохранить результат транзакции. Здесь — просто полная перезапись."""
+        self.save(items)
+
+    def stamp(self):
+        return _stat_stamp(self.path)
+
+    def changes(self, since):
+        """Изменения после штампа since: (puts, deletes, новый штамп) или None — перечитать всё.
+        Один JSON-файл частями не читается — всегда None."""
+        return None
+
+
+def _net_changes(entries):
+    """Свернуть поток {"put": [...], "del": [...]} в итоговые (puts по id, удалённые id)."""
+    puts, deletes = {}, set()
+    for entry in entries:
+        for rid in entry.get("del") or []:
+            puts.pop(rid, None)
+            deletes.add(rid)
+        for rec in entry.get("put") or []:
+            puts[rec["id"]] = rec
+            deletes.discard(rec["id"])
+    return puts, deletes
+
+
+class JournalStorage(JsonFileStorage):
+    """
+    Снимок (тот же JSON-файл) + журнал <name>.journal.
+    Каждая транзакция — одна компактная JSON-строка {"put": [...], "del": [...]},
+    дописывается в конец с fsync. Недописанная последняя строка (kill -9) при чтении
+    отбрасывается целиком, так что транзакция либо применилась, либо нет.
+    Когда журнал перерастает JOURNAL_COMPACT_BYTES, он сворачивается в новый снимок.
+    Штамп — (штамп снимка, длина журнала): другой воркер дочитывает журнал с прежней
+    длины (changes), целиком всё перечитывается только после сворачивания.
+    """
+    def __init__(self, path: Path, compact_bytes: int = JOURNAL_COMPACT_BYTES):
+        super().__init__(path)
+        self.journal = self.path.with_suffix(".journal")
+        self.compact_bytes = compact_bytes
+
+    def load(self) -> list:
+        items = super().load()
+        if not self.journal.exists():
+            return items
+
+        by_id = {}
+        for rec in items:
+            by_id[rec.get("id") or id(rec)] = rec
+        with open(self.journal, "rb") as f:
+            entries, _ = self._entries(f.read())
+        for entry in entries:
+            for rec in entry.get("put") or []:
+                by_id[rec["id"]] = rec
+            for rid in entry.get("del") or []:
+                by_id.pop(rid, None)
+        return list(by_id.values())
+
+    @staticmethod
+    def _entries(data: bytes):
+        """(записи журнала из целых строк, сколько байт занимают целые строки)."""
+        end = data.rfind(b"\n") + 1   # оборванная запись в конце — не применяем
+        entries = []
+        for raw in data[:end].splitlines():
+            try:
+                entries.append(serializer.loads(raw))
+            except ValueError:
+                continue  # обрывок, к которому потом дописали перевод строки
+        return entries, end
+
+    def changes(self, since):
+        snap = _stat_stamp(self.path)
+        if not since or since[0] != snap or since[0] is None:
+            return None   # снимок переписан (сворачивание) — только полное чтение
+        offset = since[1] or 0
+        try:
+            with open(self.journal, "rb") as f:
+                if os.fstat(f.fileno()).st_size < offset:
+                    return None
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if _stat_stamp(self.path) != snap:
+            return None   # свернули, пока читали: прочитанное могло быть уже новым журналом
+        entries, end = self._entries(data)
+        puts, deletes = _net_changes(entries)
+        return list(puts.values()), list(deletes), (snap, offset + end)
+
+    def save(self, items):
+        # полная запись = новый снимок и пустой журнал
+        atomic_write_text(self.path, dump_items(items))
+        if self.journal.exists():
+            os.truncate(self.journal, 0)
+
+    def write(self, items, puts, deletes):
+        if not puts and not deletes:
+            return
+        line = serializer.dumps({"put": list(puts), "del": list(deletes)}) + b"\n"
+        fd = os.open(self.journal, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            end = os.fstat(fd).st_size
+            if end and os.pread(fd, 1, end - 1) != b"\n":
+                line = b"\n" + line  # отделяем оборванный хвост от новой записи
+            os.write(fd, line)
+            os.fsync(fd)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size >= self.compact_bytes:
+            self.compact(items)
+
+    def compact(self, items=None):
+        """Свернуть журнал в снимок. Повторное применение журнала к снимку безопасно (put/del идемпотентны)."""
+        if items is None:
+            items = self.load()
+        self.save(items)
+
+    def stamp(self):
+        try:
+            size = os.stat(self.journal).st_size
+        except FileNotFoundError:
+            size = 0
+        return (_stat_stamp(self.path), size)
+
+
+class SqliteStorage:
+    """
+    Коллекция в таблице SQLite: запись целиком в колонке data (JSON) плюс
+    вынесенные колонки с индексами (columns: имя -> функция от записи).
+    Порядок записей — rowid (upsert по id его сохраняет).
+    Штамп — счётчик версии таблицы в meta, растёт в той же транзакции, что и запись,
+    поэтому воркеры видят чужие изменения одним дешёвым SELECT.
+    Строка помнит версию, которой записана (ver), удалённые id — в <table>_deleted:
+    другой воркер забирает только строки новее своего штампа (changes). Полная
+    перезапись (save) отмечается в meta как <table>:reset — после неё только полное чтение.
+    """
+    def __init__(self, db_path, table: str, columns: dict = None):
+        self.db_path = str(db_path)
+        self.table = table
+        self.name = table
+        self.columns = dict(columns or {})
+        self._local = threading.local()
+        self.lock = FileLock(Path(self.db_path).with_name(f".{Path(self.db_path).stem}.{table}.lock"))
+        self._schema_ready = False   # схема — при первом соединении, не при импорте (preload_app)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # после fork соединение родителя не используем
+        if conn is None or self._local.pid != os.getpid():
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn, self._local.pid = conn, os.getpid()
+            _sqlite_storages.add(self)
+            if not self._schema_ready:
+                self._init_schema(conn)
+                self._schema_ready = True
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def _init_schema(self, conn):
+        cols = "".join(f", {c} TEXT" for c in self.columns)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} "
+                     f"(id TEXT NOT NULL UNIQUE{cols}, data TEXT NOT NULL, ver INTEGER NOT NULL DEFAULT 0)")
+        if "ver" not in {r[1] for r in conn.execute(f"PRAGMA table_info({self.table})")}:
+            # таблица из версии без построчных версий: старые строки — ver 0
+            conn.execute(f"ALTER TABLE {self.table} ADD COLUMN ver INTEGER NOT NULL DEFAULT 0")
+        for c in [*self.columns, "ver"]:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.table}_{c} ON {self.table}({c})")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table}_deleted (id TEXT PRIMARY KEY, ver INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO meta(name, version) VALUES (?, 0)", (self.table,))
+        conn.execute("INSERT OR IGNORE INTO meta(name, version) VALUES (?, 0)", (f"{self.table}:reset",))
+
+    def _row(self, rec, ver):
+        return (rec["id"], *[f(rec) for f in self.columns.values()],
+                serializer.dumps_str(rec), ver)
+
+    def _upsert(self, conn, recs, ver):
+        names = ["id", *self.columns, "data", "ver"]
+        updates = ", ".join(f"{n}=excluded.{n}" for n in names[1:])
+        conn.executemany(
+            f"INSERT INTO {self.table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}",
+            [self._row(r, ver) for r in recs])
+
+    def _version(self, conn, name=None):
+        row = conn.execute("SELECT version FROM meta WHERE name = ?", (name or self.table,)).fetchone()
+        return row[0] if row else None
+
+    def _bump(self, conn) -> int:
+        conn.execute("UPDATE meta SET version = version + 1 WHERE name = ?", (self.table,))
+        return self._version(conn)
+
+    def load(self) -> list:
+        rows = self._conn().execute(f"SELECT data FROM {self.table} ORDER BY rowid")
+        return [serializer.loads(d) for (d,) in rows]
+
+    def save(self, items):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ver = self._bump(conn)
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.execute(f"DELETE FROM {self.table}_deleted")
+            self._upsert(conn, items, ver)
+            conn.execute("UPDATE meta SET version = ? WHERE name = ?", (ver, f"{self.table}:reset"))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def write(self, items, puts, deletes):
+        if not puts and not deletes:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ver = self._bump(conn)
+            if deletes:
+                conn.executemany(f"DELETE FROM {self.table} WHERE id = ?", [(d,) for d in deletes])
+                conn.executemany(f"INSERT OR REPLACE INTO {self.table}_deleted (id, ver) VALUES (?, ?)",
+                                 [(d, ver) for d in deletes])
+            if puts:
+                self._upsert(conn, puts, ver)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stamp(self):
+        return self._version(self._conn())
+
+    def changes(self, since):
+        if since is None:
+            return None
+        conn = self._conn()
+        conn.execute("BEGIN")   # версия и строки — из одного снимка базы
+        try:
+            version = self._version(conn)
+            if version is None or since > version or self._version(conn, f"{self.table}:reset") > since:
+                return None
+            # удаления раньше вставок: id, удалённый и записанный заново, остаётся
+            deletes = [rid for (rid,) in conn.execute(
+                f"SELECT id FROM {self.table}_deleted WHERE ver > ?", (since,))]
+            puts = [serializer.loads(d) for (d,) in conn.execute(
+                f"SELECT data FROM {self.table} INDEXED BY ix_{self.table}_ver WHERE ver > ? ORDER BY rowid", (since,))]
+        finally:
+            conn.execute("COMMIT")
+        return puts, deletes, version
+
+
+def make_storage(path: Path, columns: dict = None):
+    """
+    path — JSON-файл коллекции (для sqlite имя таблицы = имя файла без расширения),
+    columns — индексируемые поля для sqlite.
+    """
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteStorage(SQLITE_PATH, Path(path).stem, columns)
+    if STORAGE_BACKEND == "journal":
+        return JournalStorage(path)
+    storage = JsonFileStorage(path)
+    # переключились обратно с journal — не теряем хвост журнала
+    leftover = JournalStorage(path)
+    if leftover.journal.exists() and leftover.journal.stat().st_size > 0:
+        with leftover.lock:
+            leftover.compact()
+    return storage
@@ -0,0 +1,399 @@
+# logic/store.py
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right, insort
+import threading, traceback, uuid
+
+from logic.metrics import timer, STORAGE_SECONDS
+
+# ---------- Индексы ----------
+class HashIndex:
+    """
+    Хеш-индекс: ключ -> {id: запись}.
+    Дубликаты ключа допустимы (порядок вставки сохраняется), first() вернёт первый —
+    так же, как раньше линейный поиск по списку.
+    """
+    def __init__(self, key_fn):
+        self.key_fn = key_fn
+        self.map = {}
+
+    def rebuild(self, recs):
+        self.map = {}
+        for rec in recs:
+            self.add(rec)
+
+    def add(self, rec):
+        key = self.key_fn(rec)
+        if key:
+            self.map.setdefault(key, {})[rec["id"]] = rec
+
+    def discard(self, rec):
+        key = self.key_fn(rec)
+        bucket = self.map.get(key)
+        if bucket is not None:
+            bucket.pop(rec["id"], None)
+            if not bucket:
+                del self.map[key]
+
+    def get(self, key) -> list:
+        return list((self.map.get(key) or {}).values())
+
+    def first(self, key):
+        for rec in (self.map.get(key) or {}).values():
+            return rec
+        return None
+
+    def keys(self):
+        return self.map.keys()
+
+    def bucket(self, key) -> dict:
+        return self.map.get(key) or {}
+
+
+class MultiKeyIndex(HashIndex):
+    """HashIndex, где у записи несколько ключей: keys_fn возвращает их список (например, штрихкоды)."""
+    def add(self, rec):
+        for key in self.key_fn(rec):
+            if key:
+                self.map.setdefault(key, {})[rec["id"]] = rec
+
+    def discard(self, rec):
+        for key in self.key_fn(rec):
+            bucket = self.map.get(key)
+            if bucket is not None:
+                bucket.pop(rec["id"], None)
+                if not bucket:
+                    del self.map[key]
+
+
+class SortedIndex:
+    """
+    Упорядоченный индекс: отсортированный список (ключ, id).
+    Диапазоны, подсчёт и обход по порядку — через bisect, без сортировки на каждый запрос.
+    """
+    def __init__(self, key_fn):
+        self.key_fn = key_fn
+        self.entries = []
+
+    def rebuild(self, recs):
+        self.entries = sorted((self.key_fn(r), r["id"]) for r in recs)
+
+    def add(self, rec):
+        insort(self.entries, (self.key_fn(rec), rec["id"]))
+
+    def discard(self, rec):
+        e = (self.key_fn(rec), rec["id"])
+        i = bisect_left(self.entries, e)
+        if i < len(self.entries) and self.entries[i] == e:
+            del self.entries[i]
+
+    def span(self, lo=None, hi=None):
+        """Позиции [start, stop) для lo <= ключ <= hi (None — без границы)."""
+        start = 0 if lo is None else bisect_left(self.entries, (lo,))
+        stop = len(self.entries) if hi is None else bisect_right(self.entries, (hi, chr(0x10FFFF)))
+        return start, max(start, stop)
+
+    def ids(self, lo=None, hi=None):
+        start, stop = self.span(lo, hi)
+        return (self.entries[i][1] for i in range(start, stop))
+
+
+class GroupSum:
+    """
+    Накопительные агрегаты по группам: ключ -> [кол-во, сумма value_fn].
+    add/discard — O(1), так что итоги не пересчитываются по всем записям.
+    key_fn может вернуть None — запись в агрегат не попадает.
+    """
+    def __init__(self, key_fn, value_fn=lambda rec: 0):
+        self.key_fn = key_fn
+        self.value_fn = value_fn
+        self.groups = {}
+
+    def rebuild(self, recs):
+        self.groups = {}
+        for rec in recs:
+            self.add(rec)
+
+    def add(self, rec):
+        key = self.key_fn(rec)
+        if key is None:
+            return
+        g = self.groups.setdefault(key, [0, 0.0])
+        g[0] += 1
+        g[1] += self.value_fn(rec)
+
+    def discard(self, rec):
+        key = self.key_fn(rec)
+        g = self.groups.get(key)
+        if g is None:
+            return
+        g[0] -= 1
+        g[1] -= self.value_fn(rec)
+        if g[0] <= 0:
+            del self.groups[key]
+
+    def items(self):
+        return self.groups.items()
+
+
+class Projection:
+    """
+    Материализованное представление: id -> project_fn(запись) и группы key_fn -> {id: проекция}.
+    Проекция считается один раз при записи, чтение отдаёт уже готовые словари
+    (их не меняем — при изменении записи проекция строится заново).
+    """
+    def __init__(self, project_fn, key_fn=lambda rec: None):
+        self.project_fn = project_fn
+        self.key_fn = key_fn
+        self.rows = {}
+        self.groups = {}
+
+    def rebuild(self, recs):
+        self.rows, self.groups = {}, {}
+        for rec in recs:
+            self.add(rec)
+
+    def add(self, rec):
+        row = self.project_fn(rec)
+        self.rows[rec["id"]] = row
+        key = self.key_fn(rec)
+        if key:
+            self.groups.setdefault(key, {})[rec["id"]] = row
+
+    def discard(self, rec):
+        self.rows.pop(rec["id"], None)
+        key = self.key_fn(rec)
+        group = self.groups.get(key)
+        if group is not None:
+            group.pop(rec["id"], None)
+            if not group:
+                del self.groups[key]
+
+    def get(self, id):
+        return self.rows.get(id)
+
+    def group(self, key) -> dict:
+        return self.groups.get(key) or {}
+
+
+# ---------- Хранилище ----------
+class RecordStore:
+    """
+    Резидентная копия записей (список словарей с полем id) поверх бэкенда хранения
+    из logic/storage.py.
+
+    - данные читаются один раз; при смене штампа бэкенда (запись другого воркера gunicorn)
+      забираются только изменения (storage.changes) и применяются как put/delete —
+      целиком всё перечитывается, только если бэкенд так не умеет (json) или переписан целиком;
+    - по id и по зарегистрированным индексам поиск O(1);
+    - записи внутри хранилища не мутируем на месте: меняем копию и отдаём в put();
+    - транзакция отдаёт бэкенду только изменённые/удалённые записи.
+    """
+    def __init__(self, storage, record_type=None):
+        self.storage = storage
+        self.record_type = record_type   # None — записи как есть (dict), иначе record_type.from_dict(dict)
+        self._lock = threading.RLock()
+        self._items = {}       # id -> запись (порядок = порядок в файле)
+        self._indexes = {}     # имя -> индекс
+        self._stamp = None
+        self._loaded = False
+        self._puts = {}        # id -> запись, изменённые в текущей транзакции
+        self._deletes = set()
+        self._txn_depth = 0
+        self._seq = {}         # id -> порядковый номер вставки (стабильный порядок хранения)
+        self._next_seq = 0
+        self._version = 0      # растёт при каждом изменении данных в памяти
+        self._listeners = []   # fn(puts, deletes) после каждой записи в бэкенд
+
+    # --- индексы ---
+    def add_index(self, name: str, index):
+        with self._lock:
+            self._indexes[name] = index
+            index.rebuild(self._items.values())
+        return index
+
+    def on_commit(self, fn):
+        """
+        fn(puts, deletes) вызывается после успешной записи транзакции в бэкенд,
+        ещё под блокировкой хранилища — порядок вызовов совпадает с порядком записей.
+        """
+        self._listeners.append(fn)
+        return fn
+
+    def index(self, name: str):
+        self.refresh()
+        return self._indexes[name]
+
+    # --- синхронизация с диском ---
+    def refresh(self):
+        with self._lock:
+            stamp = self.storage.stamp()
+            if self._loaded and stamp == self._stamp:
+                return
+            if self._loaded:
+                with timer(STORAGE_SECONDS, collection=self.storage.name, op="changes"):
+                    delta = self.storage.changes(self._stamp)
+                if delta is not None:
+                    puts, deletes, self._stamp = delta
+                    self._apply(puts, deletes)
+                    return
+            # штамп берём ДО чтения: если данные поменяют во время чтения —
+            # следующий refresh увидит новый штамп и перечитает
+            with timer(STORAGE_SECONDS, collection=self.storage.name, op="load"):
+                items = self.storage.load()
+            self._stamp = self.storage.stamp() if stamp is None else stamp
+            self._reset(items)
+
+    def _reset(self, items):
+        self._items = {}
+        self._seq = {}
+        for rec in items:
+            if not rec.get("id"):
+                rec["id"] = str(uuid.uuid4())  # старые записи без id — сохранится при следующей записи
+            if self.record_type is not None:
+                rec = self.record_type.from_dict(rec)
+            self._items[rec["id"]] = rec
+            self._seq[rec["id"]] = len(self._seq)
+        self._next_seq = len(self._seq)
+        for idx in self._indexes.values():
+            idx.rebuild(self._items.values())
+        self._loaded = True
+        self._version += 1
+
+    def _apply(self, puts, deletes):
+        """Чужие изменения: в памяти и индексах, но не в текущую транзакцию (они уже на диске)."""
+        for rid in deletes:
+            self._discard(rid)
+        for rec in puts:
+            if self.record_type is not None:
+                rec = self.record_type.from_dict(rec)
+            self._store(rec)
+        if puts or deletes:
+            self._version += 1
+
+    def version(self) -> int:
+        """Счётчик версии данных этого процесса (для ключей кэша; вызывать внутри reading())."""
+        return self._version
+
+    def stamp(self):
+        """Штамп бэкенда на момент последнего чтения/записи — одинаков во всех воркерах (для ETag)."""
+        return self._stamp
+
+    def seq(self, id) -> int:
+        """Порядковый номер записи в хранилище (для сортировки «как в файле»)."""
+        return self._seq.get(id, -1)
+
+    # --- чтение ---
+    def all(self) -> list:
+        self.refresh()
+        return list(self._items.values())
+
+    def get(self, id):
+        self.refresh()
+        return self._items.get(id)
+
+    def __len__(self):
+        self.refresh()
+        return len(self._items)
+
+    # без refresh — для использования внутри reading()/transaction()
+    def peek(self, id):
+        return self._items.get(id)
+
+    def values(self):
+        return self._items.values()
+
+    @contextmanager
+    def reading(self):
+        """Согласованное чтение нескольких индексов (нужно при потоковых воркерах)."""
+        with self._lock:
+            self.refresh()
+            yield self
+
+    # --- запись ---
+    @contextmanager
+    def transaction(self):
+        """
+        Чтение-изменение-запись: под межпроцессной блокировкой бэкенда берём свежие данные,
+        на выходе — одна запись в бэкенд. Вложенная транзакция — часть внешней.
+        """
+        with self._lock:
+            if self._txn_depth:
+                self._txn_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._txn_depth -= 1
+                return
+
+            with self.storage.lock:
+                self._txn_depth = 1
+                try:
+                    self.refresh()
+                    self._puts, self._deletes = {}, set()
+                    try:
+                        yield self
+                    except BaseException:
+                        # в памяти могла остаться половина изменений — берём истину с диска
+                        self._loaded = False
+                        self._puts, self._deletes = {}, set()
+                        raise
+                    if self._puts or self._deletes:
+                        self.commit()
+                finally:
+                    self._txn_depth = 0
+
+    def put(self, rec: dict):
+        """Вставка новой записи или замена существующей (по id). Возвращает сохранённую запись."""
+        if self.record_type is not None and not isinstance(rec, self.record_type):
+            rec = self.record_type.from_dict(rec)
+        with self._lock:
+            self._store(rec)
+            self._puts[rec["id"]] = rec
+            self._deletes.discard(rec["id"])
+            self._version += 1
+        return rec
+
+    def delete(self, id) -> bool:
+        with self._lock:
+            if not self._discard(id):
+                return False
+            self._puts.pop(id, None)
+            self._deletes.add(id)
+            self._version += 1
+            return True
+
+    def _store(self, rec):
+        old = self._items.get(rec["id"])
+        if old is not None:
+            for idx in self._indexes.values():
+                idx.discard(old)
+        else:
+            self._seq[rec["id"]] = self._next_seq
+            self._next_seq += 1
+        self._items[rec["id"]] = rec
+        for idx in self._indexes.values():
+            idx.add(rec)
+
+    def _discard(self, id) -> bool:
+        old = self._items.pop(id, None)
+        if old is None:
+            return False
+        for idx in self._indexes.values():
+            idx.discard(old)
+        self._seq.pop(id, None)
+        return True
+
+    def commit(self):
+        with self._lock:
+            # items — представление без копирования: журналу оно нужно только при сворачивании
+            with timer(STORAGE_SECONDS, collection=self.storage.name, op="write"):
+                self.storage.write(self._items.values(), list(self._puts.values()), list(self._deletes))
+            self._stamp = self.storage.stamp()
+            puts, deletes = list(self._puts.values()), list(self._deletes)
+            self._puts, self._deletes = {}, set()
+            for fn in self._listeners:
+                try:
+                    fn(puts, deletes)
+                except Exception:
+                    traceback.print_exc()   # запись уже на диске — слушатель её не отменяет
+
@@ -19,16 +19,17 @@
 
   // === state ===
   const state = {
-    cache: [],       // полный список из /api/products
+    cache: [],       // текущая страница из /api/products
     page: 1,
     totalPages: 1,
   };
 
   // === API calls (ваш существующий бэкенд) ===
-  const apiList = async () => {
-    const r = await fetch('/api/products');
+  // фильтры/сортировка/страницы считает сервер: {items, total, next_cursor}
+  const apiList = async (params) => {
+    const r = await fetch('/api/products?' + new URLSearchParams(params));
     if (!r.ok) throw new Error(await r.text());
-    return r.json(); // массив
+    return r.json();
   };
   const apiCreate = async (payload) => {
     const r = await fetch('/api/products', {
@@ -54,51 +55,25 @@
     return r.json();
   };
 
-  // === client filtering/sorting/paging ===
-  const applyFilters = () => {
-    const term = (q.value || '').trim().toLowerCase();
+  // === server filtering/sorting/paging ===
+  const listParams = () => {
+    const size = Number(pageSize.value) || 20;
+    const params = {
+      limit: size,
+      offset: (state.page-1)*size,
+      sort: sort.value || 'created_desc',
+    };
+    const term = (q.value || '').trim();
     const brandSel = (brand.value || '').trim().toLowerCase();
-    const qualitySel = (quality.value || '').trim().toLowerCase();
-    let arr = [...state.cache];
-
-    if (brandSel) arr = arr.filter(x => (x.brand || '').toLowerCase() === brandSel);
-    if (qualitySel) arr = arr.filter(x => (x.quality || '').toLowerCase() === qualitySel);
-
-    if (term) {
-      arr = arr.filter(x => {
-        const hay = [
-          x.brand || '',
-          x.model || '',
-          x.quality || '',
-          (x.tags || []).join(' '),
-          x.type || '',
-          x.vendor || '',
-          x.specs || '',
-        ].join(' ').toLowerCase();
-        return hay.includes(term);
-      });
-    }
-
-    switch (sort.value) {
-      case 'price_asc':  arr.sort((a,b)=>toNumber(a.price)-toNumber(b.price)); break;
-      case 'price_desc': arr.sort((a,b)=>toNumber(b.price)-toNumber(a.price)); break;
-      case 'stock_asc':  arr.sort((a,b)=>toNumber(a.stock)-toNumber(b.stock)); break;
-      case 'stock_desc': arr.sort((a,b)=>toNumber(b.stock)-toNumber(a.stock)); break;
-      case 'model_asc':  arr.sort((a,b)=>String(a.model||'').localeCompare(String(b.model||''))); break;
-      default:           arr.sort((a,b)=>toNumber(b.created_at)-toNumber(a.created_at)); // created_desc
-    }
-    return arr;
+    const qualitySel = (quality.value || '').trim();
+    if (term) params.q = term;
+    if (brandSel) params.brand = brandSel;
+    if (qualitySel) params.quality = qualitySel;
+    return params;
   };
 
   const render = () => {
-    const filtered = applyFilters();
-    const size = Number(pageSize.value) || 20;
-    const total = filtered.length;
-    state.totalPages = Math.max(1, Math.ceil(total/size));
-    if (state.page > state.totalPages) state.page = state.totalPages;
-
-    const start = (state.page-1)*size;
-    const pageItems = filtered.slice(start, start+size);
+    const pageItems = state.cache;
 
     rows.innerHTML = '';
     for (const it of pageItems) {
@@ -131,19 +106,41 @@
   };
 
   const reload = async () => {
-    const list = await apiList();       // массив
-    // для совместимости: добавим created_at, если нет
-    state.cache = list.map(x => ({...x, created_at: x.created_at ?? 0}));
-    state.page = 1;
+    const size = Number(pageSize.value) || 20;
+    const res = await apiList(listParams());
+    state.cache = res.items || [];
+    state.totalPages = Math.max(1, Math.ceil((res.total || 0)/size));
+    if (state.page > state.totalPages) { state.page = state.totalPages; return reload(); }
     render();
   };
 
+  // === лента изменений (static/events.js) ===
+  // строки текущей страницы правим на месте; новые/удалённые товары сдвигают страницу —
+  // её перечитываем (с задержкой, чтобы пачка событий дала один запрос)
+  const feed = window.ChangeFeed;
+  const feedLive = () => Boolean(feed && feed.live());
+  let feedTimer = null;
+  const reloadSoon = () => {
+    clearTimeout(feedTimer);
+    feedTimer = setTimeout(() => reload().catch(console.error), 300);
+  };
+  if (feed) feed.on('products', (ev) => {
+    const i = state.cache.findIndex(x => String(x.id) === String(ev.rid));
+    if (ev.op === 'put' && i >= 0) { state.cache[i] = ev.item; render(); }
+    else reloadSoon();
+  });
+
   // === events ===
+  let debounce = null;
   for (const el of [q, brand, quality, sort, pageSize]) {
-    el.addEventListener('input', () => { state.page = 1; render(); });
+    el.addEventListener('input', () => {
+      state.page = 1;
+      clearTimeout(debounce);
+      debounce = setTimeout(() => reload().catch(console.error), 200);
+    });
   }
-  prev.addEventListener('click', () => { if (state.page>1){ state.page--; render(); } });
-  next.addEventListener('click', () => { if (state.page<state.totalPages){ state.page++; render(); } });
+  prev.addEventListener('click', () => { if (state.page>1){ state.page--; reload().catch(console.error); } });
+  next.addEventListener('click', () => { if (state.page<state.totalPages){ state.page++; reload().catch(console.error); } });
 
   rows.addEventListener('click', async (e) => {
     const btn = e.target.closest('button.icon'); if (!btn) return;
@@ -173,7 +170,7 @@
       if (!confirm('Удалить товар?')) return;
       try {
         await apiDelete(id);
-        await reload();
+        if (!feedLive()) await reload();
       } catch (err) {
         alert('Ошибка удаления: ' + err.message);
       }
@@ -215,7 +212,7 @@
         await apiCreate(payload);
       }
       dlg.close();
-      await reload();
+      if (!feedLive()) await reload();
     } catch (err) {
       alert('Ошибка сохранения: ' + err.message);
     }
@@ -0,0 +1,43 @@
+// static/events.js — лента изменений (SSE /api/events), см. logic/events.py
+//
+//   ChangeFeed.on('products', ev => { ... });   // ev: {op: 'put'|'delete'|'reset', rid, item}
+//   ChangeFeed.live()                            // поток подключён — перезагружать списки после своих правок не нужно
+//
+// Одно соединение на вкладку. После обрыва EventSource переподключается сам и присылает
+// Last-Event-ID — сервер дошлёт пропущенное или, если отстали слишком сильно, reset.
+window.ChangeFeed = (() => {
+  const handlers = {};
+  let es = null, connected = false, timer = null;
+
+  function dispatch(collection, ev){
+    for (const fn of handlers[collection] || []) {
+      try { fn(ev); } catch (e) { console.error(e); }
+    }
+  }
+
+  function connect(){
+    if (!window.EventSource) return;
+    es = new EventSource('/api/events?collections=' + encodeURIComponent(Object.keys(handlers).join(',')));
+    es.addEventListener('open', () => { connected = true; });
+    es.addEventListener('error', () => { connected = false; });
+    es.addEventListener('change', e => {
+      const ev = JSON.parse(e.data);
+      dispatch(ev.collection, ev);
+    });
+    es.addEventListener('reset', e => {
+      const {collections} = JSON.parse(e.data);
+      for (const c of (collections && collections.length ? collections : Object.keys(handlers))) {
+        dispatch(c, {op: 'reset', collection: c});
+      }
+    });
+  }
+
+  return {
+    on(collection, fn){
+      (handlers[collection] = handlers[collection] || []).push(fn);
+      // подписки одной страницы собираем в одно соединение
+      if (!es) { clearTimeout(timer); timer = setTimeout(connect, 0); }
+    },
+    live(){ return connected; },
+  };
+})();
@@ -0,0 +1,12 @@
+# tests/conftest.py
+"""
+Тесты запускаются из корня репозитория: python -m pytest -q.
+DATA_DIR — временный каталог: модули logic/* читают его при импорте, поэтому задаём до них.
+"""
+import os, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="admin-panel-tests-")
+os.environ.setdefault("PRELOAD_CATALOG", "0")
@@ -0,0 +1,63 @@
+# tests/test_products_paging.py
+import pytest
+
+from logic.products import products_store, normalized_item, query_products, backfill_created_seq
+
+
+@pytest.fixture
+def catalog():
+    with products_store.transaction():
+        for p in list(products_store.values()):
+            products_store.delete(p["id"])
+        for i in range(30):
+            products_store.put(normalized_item({"brand": "apple", "model": f"M{i:02d}", "quality": "Original",
+                                                "price": i, "stock": i}))
+    return [p["id"] for p in products_store.all()]
+
+
+def reload():
+    # как другой воркер или тот же после полного перечитывания: seq() нумеруется заново
+    products_store._loaded = False
+    products_store.refresh()
+
+
+def test_created_cursor_survives_reload(catalog):
+    first = query_products({"limit": "10"})
+    assert [p["id"] for p in first["items"]] == catalog[:10]
+
+    gone = catalog[3]
+    with products_store.transaction():
+        products_store.delete(gone)
+    reload()
+
+    second = query_products({"limit": "10", "cursor": first["next_cursor"]})
+    assert [p["id"] for p in second["items"]] == catalog[10:20]
+
+
+def test_created_cursor_desc_after_deleting_cursor_row(catalog):
+    first = query_products({"limit": "10", "sort": "created_desc"})
+    last = first["items"][-1]["id"]
+    with products_store.transaction():
+        products_store.delete(last)
+    reload()
+
+    second = query_products({"limit": "10", "sort": "created_desc", "cursor": first["next_cursor"]})
+    assert [p["id"] for p in second["items"]] == catalog[::-1][10:20]
+
+
+def test_backfill_keeps_storage_order(catalog):
+    with products_store.transaction():
+        for p in list(products_store.values()):
+            products_store.put({k: v for k, v in p.items() if k != "created_seq"})
+    assert backfill_created_seq() == len(catalog)
+    assert backfill_created_seq() == 0
+    reload()
+    assert [p["id"] for p in query_products({"limit": "100"})["items"]] == catalog
+
+
+def test_search_matches_vendor(catalog):
+    p = products_store.get(catalog[5])
+    with products_store.transaction():
+        products_store.put({**p, "vendor": "Shenzhen Huaqiang"})
+    found = query_products({"limit": "10", "q": "huaqiang"})
+    assert [x["id"] for x in found["items"]] == [p["id"]]
@@ -0,0 +1,213 @@
+# tests/test_storage.py
+"""Бэкенды logic/storage.py: запись и чтение, изменения для других воркеров, конкурентные upsert."""
+import multiprocessing
+
+import pytest
+
+from logic.storage import JsonFileStorage, JournalStorage, SqliteStorage, FileLock, atomic_write_text
+from logic.store import RecordStore
+
+BACKENDS = ["json", "journal", "sqlite"]
+DELTA_BACKENDS = ["journal", "sqlite"]   # умеют changes(since)
+
+
+def make(kind: str, dirpath, compact_bytes: int = 1 << 30):
+    """Хранилище коллекции items в каталоге dirpath; у каждого процесса — свой экземпляр."""
+    path = dirpath / "items.json"
+    if kind == "journal":
+        return JournalStorage(path, compact_bytes)
+    if kind == "sqlite":
+        return SqliteStorage(dirpath / "admin.sqlite3", "items", {"name": lambda r: r.get("name") or ""})
+    return JsonFileStorage(path)
+
+
+def recs(n, start=0):
+    return [{"id": f"r{i}", "n": i, "name": f"item {i}"} for i in range(start, start + n)]
+
+
+@pytest.fixture(params=BACKENDS)
+def kind(request):
+    return request.param
+
+
+def test_roundtrip(kind, tmp_path):
+    s = make(kind, tmp_path)
+    assert s.load() == []
+    s.save(recs(5))
+    assert make(kind, tmp_path).load() == recs(5)
+
+    store = RecordStore(s)
+    with store.transaction():
+        store.put({"id": "r1", "n": 100, "name": "changed"})
+        store.delete("r3")
+        store.put({"id": "r9", "n": 9, "name": "new"})
+    want = {r["id"]: r for r in recs(5)}
+    want["r1"] = {"id": "r1", "n": 100, "name": "changed"}
+    del want["r3"]
+    want["r9"] = {"id": "r9", "n": 9, "name": "new"}
+    assert {r["id"]: r for r in make(kind, tmp_path).load()} == want
+
+
+def test_stamp_changes_on_write(kind, tmp_path):
+    s = make(kind, tmp_path)
+    s.save(recs(3))
+    before = s.stamp()
+    store = RecordStore(s)
+    with store.transaction():
+        store.put({"id": "r0", "n": -1, "name": "x"})
+    assert s.stamp() != before
+
+
+def test_json_has_no_deltas(tmp_path):
+    s = JsonFileStorage(tmp_path / "items.json")
+    s.save(recs(2))
+    assert s.changes(s.stamp()) is None
+
+
+def test_atomic_write_leaves_no_temp(tmp_path):
+    fp = tmp_path / "sub" / "a.json"
+    atomic_write_text(fp, "[1]")
+    atomic_write_text(fp, b"[2]")
+    assert fp.read_bytes() == b"[2]"
+    assert [p.name for p in fp.parent.iterdir()] == ["a.json"]
+
+
+def test_file_lock_is_reentrant(tmp_path):
+    lock = FileLock(tmp_path / ".lock")
+    with lock:
+        with lock:
+            pass
+        assert lock._depth == 1
+    assert lock._fd is None
+
+
+# --- изменения другого воркера: changes(since) против полного чтения ---
+def _snapshot(store):
+    return {r["id"]: r for r in store.all()}
+
+
+@pytest.mark.parametrize("kind", DELTA_BACKENDS)
+def test_changes_match_full_reload(kind, tmp_path):
+    make(kind, tmp_path).save(recs(20))
+    writer, reader = RecordStore(make(kind, tmp_path)), RecordStore(make(kind, tmp_path))
+    reader.refresh()
+    since = reader.stamp()
+
+    with writer.transaction():
+        writer.put({"id": "r1", "n": 101, "name": "changed"})
+        writer.delete("r2")
+        writer.put({"id": "new", "n": 1, "name": "new"})
+    with writer.transaction():
+        writer.put({"id": "r2", "n": 2, "name": "back again"})   # удалённый id записан заново
+        writer.delete("new")
+        writer.put({"id": "r1", "n": 102, "name": "changed twice"})
+
+    delta = reader.storage.changes(since)
+    assert delta is not None
+    puts, deletes, _ = delta
+    assert {r["id"] for r in puts} >= {"r1", "r2"}
+    assert "new" in deletes
+
+    reader.refresh()
+    assert _snapshot(reader) == _snapshot(RecordStore(make(kind, tmp_path)))
+    assert reader.get("r1")["n"] == 102 and reader.get("new") is None
+
+
+@pytest.mark.parametrize("kind", DELTA_BACKENDS)
+def test_full_rewrite_forces_reload(kind, tmp_path):
+    s = make(kind, tmp_path)
+    s.save(recs(5))
+    since = s.stamp()
+    make(kind, tmp_path).save(recs(3, start=10))
+    assert s.changes(since) is None
+    store = RecordStore(make(kind, tmp_path))
+    assert sorted(_snapshot(store)) == ["r10", "r11", "r12"]
+
+
+def test_sqlite_adds_ver_to_old_table(tmp_path):
+    import sqlite3
+    conn = sqlite3.connect(tmp_path / "admin.sqlite3")
+    conn.execute("CREATE TABLE items (id TEXT NOT NULL UNIQUE, name TEXT, data TEXT NOT NULL)")
+    conn.execute("""INSERT INTO items VALUES ('a', 'x', '{"id": "a", "name": "x"}')""")
+    conn.commit()
+    conn.close()
+
+    s = make("sqlite", tmp_path)
+    assert s.load() == [{"id": "a", "name": "x"}]
+    since = s.stamp()
+    store = RecordStore(make("sqlite", tmp_path))
+    with store.transaction():
+        store.put({"id": "b", "name": "y"})
+    puts, deletes, _ = s.changes(since)
+    assert [r["id"] for r in puts] == ["b"] and deletes == []
+
+
+# --- журнал: оборванный хвост и сворачивание ---
+def test_journal_drops_truncated_tail(tmp_path):
+    s = make("journal", tmp_path)
+    s.save(recs(3))
+    store = RecordStore(s)
+    with store.transaction():
+        store.put({"id": "r0", "n": 10, "name": "ok"})
+    reader = RecordStore(make("journal", tmp_path))
+    reader.refresh()
+    since = reader.stamp()
+
+    with open(s.journal, "ab") as f:   # kill -9 посреди записи
+        f.write(b'{"put": [{"id": "r1", "n": 99')
+    assert {r["id"]: r["n"] for r in make("journal", tmp_path).load()} == {"r0": 10, "r1": 1, "r2": 2}
+    assert reader.storage.changes(since)[:2] == ([], [])
+
+    with store.transaction():   # следующая запись отделяется от обрывка переводом строки
+        store.put({"id": "r2", "n": 20, "name": "after tail"})
+    reader.refresh()
+    assert {r["id"]: r["n"] for r in reader.all()} == {"r0": 10, "r1": 1, "r2": 20}
+    assert _snapshot(reader) == _snapshot(RecordStore(make("journal", tmp_path)))
+
+
+def test_journal_compaction(tmp_path):
+    s = make("journal", tmp_path, compact_bytes=300)
+    s.save(recs(3))
+    reader = RecordStore(make("journal", tmp_path))
+    reader.refresh()
+    since = reader.stamp()
+
+    store = RecordStore(s)
+    for i in range(10):
+        with store.transaction():
+            store.put({"id": f"x{i}", "n": i, "name": "x" * 40})
+    assert s.journal.stat().st_size < 300   # свернулся в снимок
+    assert {r["id"] for r in JsonFileStorage(s.path).load()} >= {"r0", "x0"}
+
+    assert reader.storage.changes(since) is None   # снимок другой — только полное чтение
+    reader.refresh()
+    assert _snapshot(reader) == _snapshot(RecordStore(make("journal", tmp_path)))
+    assert len(reader) == 13
+
+
+# --- несколько процессов: read-modify-write под блокировкой бэкенда ---
+PROCS, ROUNDS = 3, 60
+
+
+def _bump_counter(kind, dirpath, worker):
+    store = RecordStore(make(kind, dirpath))
+    for i in range(ROUNDS):
+        with store.transaction():
+            c = store.get("counter") or {"id": "counter", "n": 0}
+            store.put({**c, "n": c["n"] + 1})
+            store.put({"id": f"w{worker}-{i}", "n": i})   # и новая запись на каждом шаге
+
+
+def test_multiprocess_upserts_lose_nothing(kind, tmp_path):
+    make(kind, tmp_path).save([])
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_bump_counter, args=(kind, tmp_path, w)) for w in range(PROCS)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    items = {r["id"]: r for r in make(kind, tmp_path).load()}
+    assert items["counter"]["n"] == PROCS * ROUNDS
+    assert len(items) == 1 + PROCS * ROUNDS